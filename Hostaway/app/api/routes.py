@@ -1,5 +1,10 @@
-from fastapi import APIRouter, HTTPException, Request
-from app.services.pre_check_in_guest_filtering import check_verifications, webhook, arrivals
+import asyncio
+from fastapi import APIRouter, HTTPException, Request, Response
+from pydantic import ValidationError
+from app.services.webhook_ingest import ReservationEvent, ingest
+from app.services.scheduler import run_sweep
+from app.db import sweep_history
+from app.services import metrics
 from app.logging_to_file import setup_logger
 
 
@@ -10,45 +15,77 @@ router = APIRouter()
 
 
 @router.get("/check_verifications")
-def get_verifications():
+async def get_verifications():
     logger.info("GET /check_verifications called")
     try:
-        result = check_verifications()
+        result = await run_sweep("check_verifications")
+        if result['status_code'] == 409:
+            return {"status": "skipped", "detail": "sweep already running"}
         if result['status_code'] == 200:
-            return {"status": "success"}
+            return {"status": "success", "run_id": result["run_id"], "summary": result["summary"]}
 
-        return {"status": "failed"}
+        return {"status": "failed", "run_id": result["run_id"], "summary": result["summary"]}
     except Exception as e:
         logger.exception("Error in /check_verifications")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/check_arrivals")
-def get_verifications():
+async def get_arrivals():
     logger.info("GET /check_arrivals called")
     try:
-        result = arrivals()
+        result = await run_sweep("arrivals")
+        if result['status_code'] == 409:
+            return {"status": "skipped", "detail": "sweep already running"}
         if result['status_code'] == 200:
-            return {"status": "success"}
+            return {"status": "success", "run_id": result["run_id"], "summary": result["summary"]}
 
-        return {"status": "failed"}
+        return {"status": "failed", "run_id": result["run_id"], "summary": result["summary"]}
     except Exception as e:
         logger.exception("Error in /check_verifications")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/webhook/reservation")
-async def webhook_reservation(request: Request):
-    logger.info("POST /webhook/reservation called")
-    try:
-        data = await request.json()
-        logger.info(f"Received data: {data}")
-        return await webhook(data)
-    except Exception as e:
-        logger.exception("Error in /webhook/reservation")
-        raise HTTPException(status_code=500, detail=str(e))
-
+@router.get("/sweeps")
+async def get_sweeps(sweep: str = None, limit: int = 20):
+    # Runs without their per-reservation details; fetch a single run for them.
+    runs = await asyncio.to_thread(sweep_history.recent, sweep, min(max(limit, 1), 200))
+    return {"runs": runs}
 
 
+@router.get("/sweeps/{run_id}")
+async def get_sweep(run_id: int):
+    run = await asyncio.to_thread(sweep_history.get, run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="sweep run not found")
+    return run
 
 
+@router.post("/webhook/reservation", status_code=202)
+@metrics.timed(metrics.WEBHOOK_SECONDS, metrics.WEBHOOK_ERRORS, stage="ingest")
+async def webhook_reservation(request: Request):
+    try:
+        event = ReservationEvent.model_validate_json(await request.body())
+    except ValidationError as e:
+        logger.warning(f"Rejected reservation webhook: {e.error_count()} validation errors")
+        # No input in the detail: it may be bytes, and it holds guest data.
+        raise HTTPException(
+            status_code=422, detail=e.errors(include_url=False, include_context=False, include_input=False)
+        )
+
+    logger.debug(f"Received reservation webhook {event.event}", extra={"reservation_id": event.id})
+    outcome = await ingest.submit(event)
+    if outcome == "dropped":
+        raise HTTPException(status_code=503, detail="webhook queue is full", headers={"Retry-After": "30"})
+    return {"status": outcome}
+
+
+@router.get("/webhook/stats")
+async def webhook_stats():
+    return ingest.stats()
+
+
+@router.get("/metrics")
+async def get_metrics():
+    # Some gauges read the local database, so render off the event loop.
+    return Response(await asyncio.to_thread(metrics.render), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,68 @@
+import json
+import time
+from app.db import local_store
+
+# Listings are stored per page of the Hostaway listing, so a page answered
+# with 304 Not Modified keeps its rows and only has its timestamp bumped.
+local_store.register_schema("""
+CREATE TABLE IF NOT EXISTS listings (
+    id INTEGER PRIMARY KEY,
+    page_offset INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS listings_page ON listings (page_offset);
+CREATE TABLE IF NOT EXISTS listing_pages (
+    page_offset INTEGER PRIMARY KEY,
+    etag TEXT,
+    size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL
+);
+""")
+
+
+def page(offset: int):
+    # (etag, number of listings) of a stored page, or None.
+    row = local_store.connect().execute(
+        "SELECT etag, size FROM listing_pages WHERE page_offset = ?", (offset,)
+    ).fetchone()
+    return (row["etag"], row["size"]) if row else None
+
+
+def put_page(offset: int, listings: list, etag: str = None) -> None:
+    now = time.time()
+    with local_store.transaction() as conn:
+        conn.execute("DELETE FROM listings WHERE page_offset = ?", (offset,))
+        conn.executemany(
+            "INSERT INTO listings (id, page_offset, data) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET page_offset = excluded.page_offset, data = excluded.data",
+            [(int(l["id"]), offset, json.dumps(l)) for l in listings if l.get("id") is not None]
+        )
+        conn.execute(
+            "INSERT INTO listing_pages (page_offset, etag, size, fetched_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(page_offset) DO UPDATE SET etag = excluded.etag, size = excluded.size, "
+            "fetched_at = excluded.fetched_at",
+            (offset, etag, len(listings), now)
+        )
+
+
+def touch_page(offset: int) -> None:
+    with local_store.transaction() as conn:
+        conn.execute("UPDATE listing_pages SET fetched_at = ? WHERE page_offset = ?", (time.time(), offset))
+
+
+def drop_pages_from(offset: int) -> None:
+    # Pages past the end of a shorter listing.
+    with local_store.transaction() as conn:
+        conn.execute("DELETE FROM listings WHERE page_offset >= ?", (offset,))
+        conn.execute("DELETE FROM listing_pages WHERE page_offset >= ?", (offset,))
+
+
+def refreshed_at():
+    # The oldest page decides how fresh the whole cache is.
+    row = local_store.connect().execute("SELECT MIN(fetched_at) FROM listing_pages").fetchone()
+    return row[0]
+
+
+def all_listings() -> list:
+    rows = local_store.connect().execute("SELECT data FROM listings").fetchall()
+    return [json.loads(row["data"]) for row in rows]
@@ -0,0 +1,70 @@
+import os
+import sqlite3
+import threading
+from app.settings import settings
+
+LOCAL_DB_PATH = settings.local_db_path
+
+_local = threading.local()
+_schemas = []
+_schema_lock = threading.Lock()
+
+
+def register_schema(sql) -> None:
+    # `sql` is a script of idempotent statements, or a callable taking the
+    # connection for migrations that need to inspect the existing schema.
+    with _schema_lock:
+        _schemas.append(sql)
+
+
+def connect() -> sqlite3.Connection:
+    # One connection per thread; SQLite connections must not be shared.
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        if _local.applied < len(_schemas):
+            _apply_schemas(conn)
+        return conn
+
+    os.makedirs(os.path.dirname(LOCAL_DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(LOCAL_DB_PATH, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+
+    _local.conn = conn
+    _local.applied = 0
+    _apply_schemas(conn)
+    return conn
+
+
+def _apply_schemas(conn: sqlite3.Connection) -> None:
+    with _schema_lock:
+        for sql in _schemas[_local.applied:]:
+            if callable(sql):
+                sql(conn)
+            else:
+                conn.executescript(sql)
+        _local.applied = len(_schemas)
+
+
+def add_column(conn: sqlite3.Connection, table: str, column: str, declaration: str) -> None:
+    columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+
+class transaction:
+    # BEGIN IMMEDIATE takes the write lock up front, so read-then-write
+    # sequences inside the block cannot interleave across processes.
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn = connect()
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+        return False
@@ -0,0 +1,35 @@
+import os
+import socket
+import time
+from app.db import local_store
+
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+local_store.register_schema("""
+CREATE TABLE IF NOT EXISTS locks (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+""")
+
+
+def acquire(name: str, ttl: float, owner: str = OWNER) -> bool:
+    # Lease lock: an expired lease can be taken over, so a crashed holder
+    # blocks others for at most `ttl` seconds. Acquiring again under the same
+    # owner renews the lease; callers that must exclude each other within one
+    # process pass an owner of their own.
+    now = time.time()
+    with local_store.transaction() as conn:
+        cursor = conn.execute(
+            "INSERT INTO locks (name, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE locks.expires_at < ? OR locks.owner = excluded.owner",
+            (name, owner, now + ttl, now)
+        )
+    return cursor.rowcount == 1
+
+
+def release(name: str, owner: str = OWNER) -> None:
+    with local_store.transaction() as conn:
+        conn.execute("DELETE FROM locks WHERE name = ? AND owner = ?", (name, owner))
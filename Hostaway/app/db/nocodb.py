@@ -1,12 +1,13 @@
-import requests
-import os
-from dotenv import load_dotenv
+from app.services.http_client import client as http
+from app.settings import settings
 
-load_dotenv()
 
-API_ANSWERS_URL = f"{os.getenv('API_ANSWERS_URL')}"
-API_REMINDERS_URL = f"{os.getenv('API_REMINDERS_URL')}"
-API_KEY = f"{os.getenv('DB_API_KEY')}"
+API_ANSWERS_URL = f"{settings.api_answers_url}"
+API_REMINDERS_URL = f"{settings.api_reminders_url}"
+API_KEY = f"{settings.db_api_key}"
+
+PAGE_SIZE = 1000
+WHERE_CHUNK = 50
 
 headers = {
     "xc-token": API_KEY,
@@ -14,66 +15,51 @@ headers = {
 }
 
 
-def was_reminder_sent(id: int, table: str) -> int:
-    params = {
-        "where": f"(reservation_id,eq,{id})"
-    }
-
-    response = requests.get(f"{API_REMINDERS_URL}/{table}", params=params, headers=headers)
-    data = response.json()
-    rows = data.get("list", [])
-
-    sent_count = len(rows)
-
-    if sent_count < 3:
-        new_row = {"reservation_id": id}
-        insert_resp = requests.post(f"{API_REMINDERS_URL}/{table}", headers=headers, json=new_row)
-
-        if insert_resp.status_code in (200, 201):
-            print(f"Reminder #{sent_count + 1} sent for reservation {id}.")
-            return sent_count + 1
-
-        else:
-            print(f"Failed to insert reminder for reservation {id}.")
-            return sent_count
-
-    else:
-        print(f"Max reminders reached for reservation {id}.")
-        return 4
-
-
-def arrival_message(id: int, table: str) -> int:
-    params = {
-        "where": f"(reservation_id,eq,{id})"
-    }
-
-    response = requests.get(f"{API_REMINDERS_URL}/{table}", params=params, headers=headers)
-    data = response.json()
-    rows = data.get("list", [])
-
-    sent_count = len(rows)
-
-    if sent_count:
-        return 300
-
-    else:
-        new_row = {"reservation_id": id}
-        insert_resp = requests.post(f"{API_REMINDERS_URL}/{table}", headers=headers, json=new_row)
+async def reminder_counts_async(ids: list, table: str) -> dict:
+    counts = {int(id): 0 for id in ids}
+    unique_ids = list(counts)
 
-        if insert_resp.status_code in (200, 201):
-            print(f"Arrival message sent for reservation {id}.")
-            return 200
+    for start in range(0, len(unique_ids), WHERE_CHUNK):
+        chunk = unique_ids[start:start + WHERE_CHUNK]
+        where = "~or".join(f"(reservation_id,eq,{id})" for id in chunk)
+        offset = 0
 
-        else:
-            print(f"Failed to insert id for reservation {id}.")
-            return 500
+        while True:
+            params = {"where": where, "fields": "reservation_id", "limit": PAGE_SIZE, "offset": offset}
+            response = await http.get(
+                "nocodb", f"{API_REMINDERS_URL}/{table}", params=params, headers=headers, operation="reminder_counts"
+            )
+            response.raise_for_status()
+            data = response.json()
+            rows = data.get("list", [])
 
+            for row in rows:
+                reservation_id = int(row["reservation_id"])
+                if reservation_id in counts:
+                    counts[reservation_id] += 1
 
+            page_info = data.get("pageInfo", {})
+            if page_info.get("isLastPage", True) or len(rows) < PAGE_SIZE:
+                break
+            offset += len(rows)
 
+    return counts
 
 
+async def insert_reminders_async(ids: list, table: str) -> bool:
+    if not ids:
+        return True
 
+    new_rows = [{"reservation_id": id} for id in ids]
+    insert_resp = await http.post(
+        "nocodb", f"{API_REMINDERS_URL}/{table}", headers=headers, json=new_rows, operation="insert_reminders"
+    )
+    return insert_resp.status_code in (200, 201)
 
 
+def reminder_counts(ids: list, table: str) -> dict:
+    return http.run_sync(reminder_counts_async(ids, table))
 
 
+def insert_reminders(ids: list, table: str) -> bool:
+    return http.run_sync(insert_reminders_async(ids, table))
@@ -0,0 +1,248 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+import app.db.nocodb as nocodb
+from app.db import local_store
+from app.logging_to_file import setup_logger
+from app.settings import settings
+
+logger = setup_logger(__name__)
+
+MAX_REMINDERS = 3
+REPLICATION_INTERVAL = settings.reminder_replication_interval
+REPLICATION_BATCH = 500
+REPLICATION_LEASE = 5 * 60
+
+local_store.register_schema("""
+CREATE TABLE IF NOT EXISTS reminder_ledger (
+    reservation_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    step INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    replicated INTEGER NOT NULL DEFAULT 0,
+    replicating_at REAL,
+    PRIMARY KEY (reservation_id, kind, step)
+);
+CREATE INDEX IF NOT EXISTS reminder_ledger_replication ON reminder_ledger (replicated, kind);
+CREATE TABLE IF NOT EXISTS reminder_seeds (
+    reservation_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    PRIMARY KEY (reservation_id, kind)
+);
+""")
+
+
+
+def _add_ledger_status(conn):
+    # A claimed step stays 'pending' until the outbox has delivered it; rows
+    # from before the outbox existed were all sent.
+    local_store.add_column(conn, "reminder_ledger", "status", "TEXT NOT NULL DEFAULT 'sent'")
+
+
+local_store.register_schema(_add_ledger_status)
+
+# BEGIN IMMEDIATE serialises claims across processes; the lock keeps threads
+# of this process from queueing up on SQLite's busy timeout.
+_claim_lock = threading.Lock()
+
+
+def unseeded(ids: list, kind: str) -> list:
+    conn = local_store.connect()
+    seeded = set()
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        rows = conn.execute(
+            f"SELECT reservation_id FROM reminder_seeds WHERE kind = ? "
+            f"AND reservation_id IN ({','.join('?' * len(chunk))})",
+            (kind, *chunk)
+        ).fetchall()
+        seeded.update(row[0] for row in rows)
+    return [id for id in ids if id not in seeded]
+
+
+def claim(ids: list, kind: str, max_steps: int, seeds: dict = None) -> dict:
+    # Atomically take the next step for every reservation. The primary key
+    # makes a step impossible to take twice, whoever is asking.
+    seeds = seeds or {}
+    now = time.time()
+    result = {}
+
+    with _claim_lock, local_store.transaction() as conn:
+        for id, count in seeds.items():
+            conn.executemany(
+                "INSERT OR IGNORE INTO reminder_ledger (reservation_id, kind, step, created_at, replicated) "
+                "VALUES (?, ?, ?, ?, 1)",
+                [(id, kind, step, now) for step in range(1, count + 1)]
+            )
+            conn.execute("INSERT OR IGNORE INTO reminder_seeds (reservation_id, kind) VALUES (?, ?)", (id, kind))
+
+        for id in ids:
+            row = conn.execute(
+                "SELECT COALESCE(MAX(step), 0) FROM reminder_ledger WHERE reservation_id = ? AND kind = ?",
+                (id, kind)
+            ).fetchone()
+            sent_count = row[0]
+            if sent_count >= max_steps:
+                result[id] = None
+                continue
+            conn.execute(
+                "INSERT INTO reminder_ledger (reservation_id, kind, step, created_at, status) "
+                "VALUES (?, ?, ?, ?, 'pending')",
+                (id, kind, sent_count + 1, now)
+            )
+            result[id] = sent_count + 1
+
+    return result
+
+
+async def claim_async(ids: list, kind: str, max_steps: int) -> dict:
+    ids = list(dict.fromkeys(int(id) for id in ids))
+
+    # Reservations the ledger has never seen start from the counts already
+    # recorded in NocoDB, so switching to the ledger does not resend steps.
+    missing = await asyncio.to_thread(unseeded, ids, kind)
+    seeds = await nocodb.reminder_counts_async(missing, kind) if missing else {}
+
+    return await asyncio.to_thread(claim, ids, kind, max_steps, seeds)
+
+
+async def were_reminders_sent_async(ids: list, table: str) -> dict:
+    steps = await claim_async(ids, table, MAX_REMINDERS)
+
+    result = {}
+    for id, step in steps.items():
+        if step is None:
+            logger.debug(f"Max reminders reached for reservation {id}.", extra={"reservation_id": id})
+            result[id] = 4
+        else:
+            logger.debug(f"Reminder #{step} claimed for reservation {id}.", extra={"reservation_id": id})
+            result[id] = step
+    return result
+
+
+async def arrival_messages_async(ids: list, table: str) -> dict:
+    steps = await claim_async(ids, table, 1)
+
+    result = {}
+    for id, step in steps.items():
+        if step is None:
+            result[id] = 300
+        else:
+            logger.debug(f"Arrival message claimed for reservation {id}.", extra={"reservation_id": id})
+            result[id] = 200
+    return result
+
+
+def confirm(conn, rows: list) -> None:
+    # `rows` are (reservation_id, kind, step); only delivered steps count
+    # and are copied to NocoDB.
+    conn.executemany(
+        "UPDATE reminder_ledger SET status = 'sent', replicated = 0 "
+        "WHERE reservation_id = ? AND kind = ? AND step = ? AND status = 'pending'",
+        rows
+    )
+
+
+def release(conn, rows: list) -> None:
+    # An undeliverable step is given back, so the next sweep claims it again.
+    conn.executemany(
+        "DELETE FROM reminder_ledger WHERE reservation_id = ? AND kind = ? AND step = ? AND status = 'pending'",
+        rows
+    )
+
+
+def release_claims(rows: list) -> None:
+    with local_store.transaction() as conn:
+        release(conn, rows)
+
+
+@asynccontextmanager
+async def released_on_error(rows: list):
+    # Steps claimed for messages that then never reach the outbox are given
+    # back at once, so a retry (or the next sweep) can claim them again.
+    try:
+        yield
+    except BaseException:
+        await asyncio.to_thread(release_claims, rows)
+        raise
+
+
+def take_unreplicated(limit: int = REPLICATION_BATCH) -> dict:
+    now = time.time()
+    with local_store.transaction() as conn:
+        rows = conn.execute(
+            "SELECT reservation_id, kind, step FROM reminder_ledger "
+            "WHERE status = 'sent' AND (replicated = 0 OR (replicated = 2 AND replicating_at < ?)) LIMIT ?",
+            (now - REPLICATION_LEASE, limit)
+        ).fetchall()
+        conn.executemany(
+            "UPDATE reminder_ledger SET replicated = 2, replicating_at = ? "
+            "WHERE reservation_id = ? AND kind = ? AND step = ?",
+            [(now, row["reservation_id"], row["kind"], row["step"]) for row in rows]
+        )
+
+    by_kind = {}
+    for row in rows:
+        by_kind.setdefault(row["kind"], []).append((row["reservation_id"], row["step"]))
+    return by_kind
+
+
+def mark_replicated(kind: str, rows: list, replicated: bool) -> None:
+    with local_store.transaction() as conn:
+        conn.executemany(
+            "UPDATE reminder_ledger SET replicated = ?, replicating_at = NULL "
+            "WHERE reservation_id = ? AND kind = ? AND step = ?",
+            [(1 if replicated else 0, id, kind, step) for id, step in rows]
+        )
+
+
+async def replicate_once() -> int:
+    by_kind = await asyncio.to_thread(take_unreplicated)
+    replicated = 0
+
+    for kind, rows in by_kind.items():
+        try:
+            ok = await nocodb.insert_reminders_async([id for id, _ in rows], kind)
+        except Exception as e:
+            logger.warning(f"Reminder replication to NocoDB table {kind} failed: {e}")
+            ok = False
+        await asyncio.to_thread(mark_replicated, kind, rows, ok)
+        if ok:
+            replicated += len(rows)
+
+    return replicated
+
+
+class Replicator:
+    # Write-behind copy of the ledger into the NocoDB reminder tables, which
+    # stay the place ops look at but are no longer on the send path.
+    def __init__(self, interval: float = REPLICATION_INTERVAL):
+        self.interval = interval
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        try:
+            await replicate_once()
+        except Exception as e:
+            logger.warning(f"Final reminder replication failed: {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                await replicate_once()
+            except Exception as e:
+                logger.error(f"Reminder replication failed: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+
+replicator = Replicator()
@@ -0,0 +1,105 @@
+import json
+import time
+from app.db import local_store
+
+local_store.register_schema("""
+CREATE TABLE IF NOT EXISTS reservations (
+    id INTEGER PRIMARY KEY,
+    arrival_date TEXT,
+    status TEXT,
+    updated_on TEXT,
+    data TEXT NOT NULL,
+    cached_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reservations_arrival ON reservations (arrival_date);
+CREATE TABLE IF NOT EXISTS reservation_syncs (
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    synced_at REAL NOT NULL,
+    full_synced_at REAL NOT NULL,
+    PRIMARY KEY (start_date, end_date)
+);
+""")
+
+
+def put(reservations: list) -> None:
+    now = time.time()
+    rows = [
+        (int(r["id"]), r.get("arrivalDate"), r.get("status"), r.get("updatedOn"), json.dumps(r), now)
+        for r in reservations if r.get("id") is not None
+    ]
+    if not rows:
+        return
+    with local_store.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO reservations (id, arrival_date, status, updated_on, data, cached_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET arrival_date = excluded.arrival_date, status = excluded.status, "
+            "updated_on = excluded.updated_on, data = excluded.data, cached_at = excluded.cached_at",
+            rows
+        )
+
+
+def get(id: int, max_age: float):
+    row = local_store.connect().execute(
+        "SELECT data FROM reservations WHERE id = ? AND cached_at >= ?", (int(id), time.time() - max_age)
+    ).fetchone()
+    return json.loads(row["data"]) if row else None
+
+
+def window(start_date: str, end_date: str) -> list:
+    rows = local_store.connect().execute(
+        "SELECT data FROM reservations WHERE arrival_date BETWEEN ? AND ? ORDER BY arrival_date, id",
+        (start_date, end_date)
+    ).fetchall()
+    return [json.loads(row["data"]) for row in rows]
+
+
+def last_sync(start_date: str, end_date: str):
+    # Any sync whose range covers the requested one will do, so the arrivals
+    # sweep can reuse the wider verification window.
+    row = local_store.connect().execute(
+        "SELECT MAX(synced_at) AS synced_at, MAX(full_synced_at) AS full_synced_at FROM reservation_syncs "
+        "WHERE start_date <= ? AND end_date >= ?",
+        (start_date, end_date)
+    ).fetchone()
+    if row is None or row["synced_at"] is None:
+        return None, None
+    return row["synced_at"], row["full_synced_at"]
+
+
+def mark_synced(start_date: str, end_date: str, synced_at: float, full: bool) -> None:
+    with local_store.transaction() as conn:
+        _mark_synced(conn, start_date, end_date, synced_at, full)
+
+
+def finish_full_sync(start_date: str, end_date: str, listed_ids: set, synced_at: float) -> int:
+    # A full listing is the truth for its window: cached rows it did not
+    # return (dates moved away, a webhook lost) are dropped. Rows written
+    # after the listing started, e.g. by a webhook, are kept.
+    with local_store.transaction() as conn:
+        rows = conn.execute(
+            "SELECT id FROM reservations WHERE arrival_date BETWEEN ? AND ? AND cached_at < ?",
+            (start_date, end_date, synced_at)
+        ).fetchall()
+        stale = [(row["id"],) for row in rows if row["id"] not in listed_ids]
+        conn.executemany("DELETE FROM reservations WHERE id = ?", stale)
+        _mark_synced(conn, start_date, end_date, synced_at, True)
+    return len(stale)
+
+
+def _mark_synced(conn, start_date: str, end_date: str, synced_at: float, full: bool) -> None:
+    # A window first seen through an incremental sync has never been fully
+    # listed; 0 makes the next sweep re-list it.
+    conn.execute(
+        "INSERT INTO reservation_syncs (start_date, end_date, synced_at, full_synced_at) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(start_date, end_date) DO UPDATE SET synced_at = excluded.synced_at, "
+        "full_synced_at = CASE WHEN ? THEN excluded.full_synced_at ELSE full_synced_at END",
+        (start_date, end_date, synced_at, synced_at if full else 0, full)
+    )
+
+
+def prune(before_date: str) -> None:
+    with local_store.transaction() as conn:
+        conn.execute("DELETE FROM reservations WHERE arrival_date < ?", (before_date,))
+        conn.execute("DELETE FROM reservation_syncs WHERE end_date < ?", (before_date,))
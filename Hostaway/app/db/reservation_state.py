@@ -0,0 +1,81 @@
+import time
+from app.db import local_store
+
+# What a sweep last concluded about each reservation: the verification and
+# registration state it saw, the reminder step it reached and when the next
+# reminder is due. A sweep re-evaluates a reservation only when it is new,
+# its fingerprint changed, something marked it dirty or its reminder is due.
+local_store.register_schema("""
+CREATE TABLE IF NOT EXISTS reservation_state (
+    reservation_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    arrival_date TEXT,
+    fingerprint TEXT NOT NULL,
+    verification TEXT,
+    registration TEXT,
+    step INTEGER NOT NULL DEFAULT 0,
+    outcome TEXT NOT NULL,
+    evaluated_at REAL NOT NULL,
+    next_due_at REAL,
+    dirty_at REAL,
+    PRIMARY KEY (reservation_id, kind)
+);
+CREATE INDEX IF NOT EXISTS reservation_state_arrival ON reservation_state (arrival_date);
+""")
+
+
+def load(ids: list, kind: str) -> dict:
+    conn = local_store.connect()
+    states = {}
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        rows = conn.execute(
+            f"SELECT * FROM reservation_state WHERE kind = ? "
+            f"AND reservation_id IN ({','.join('?' * len(chunk))})",
+            (kind, *chunk)
+        ).fetchall()
+        states.update((row["reservation_id"], dict(row)) for row in rows)
+    return states
+
+
+def settled(state: dict, fingerprint: str, now: float) -> bool:
+    return (state is not None and state["dirty_at"] is None and state["fingerprint"] == fingerprint
+            and (state["next_due_at"] is None or state["next_due_at"] > now))
+
+
+def save(rows: list, loaded_at: float) -> None:
+    # `rows` are (reservation_id, kind, arrival_date, fingerprint, verification,
+    # registration, step, outcome, evaluated_at, next_due_at). A dirty mark
+    # made after the states were loaded survives the save.
+    if not rows:
+        return
+    with local_store.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO reservation_state (reservation_id, kind, arrival_date, fingerprint, verification, "
+            "registration, step, outcome, evaluated_at, next_due_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(reservation_id, kind) DO UPDATE SET arrival_date = excluded.arrival_date, "
+            "fingerprint = excluded.fingerprint, verification = excluded.verification, "
+            "registration = excluded.registration, step = excluded.step, outcome = excluded.outcome, "
+            "evaluated_at = excluded.evaluated_at, next_due_at = excluded.next_due_at, "
+            "dirty_at = CASE WHEN dirty_at > ? THEN dirty_at ELSE NULL END",
+            [(*row, loaded_at) for row in rows]
+        )
+
+
+def mark_dirty(conn, ids: list) -> None:
+    # Inside the caller's transaction, e.g. when the outbox gives up on a
+    # reminder and releases its ledger step.
+    now = time.time()
+    conn.executemany(
+        "UPDATE reservation_state SET dirty_at = ? WHERE reservation_id = ?", [(now, int(id)) for id in ids]
+    )
+
+
+def invalidate(ids: list) -> None:
+    with local_store.transaction() as conn:
+        mark_dirty(conn, ids)
+
+
+def prune(before_date: str) -> None:
+    with local_store.transaction() as conn:
+        conn.execute("DELETE FROM reservation_state WHERE arrival_date < ?", (before_date,))
@@ -0,0 +1,84 @@
+import json
+import time
+from app.db import local_store
+
+local_store.register_schema("""
+CREATE TABLE IF NOT EXISTS sweep_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sweep TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    status TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    duration REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS sweep_runs_sweep ON sweep_runs (sweep, started_at);
+""")
+
+
+# Per-reservation parts of a sweep summary, which grow with the number of
+# bookings; the history listing never reads them.
+DETAIL_KEYS = ("ids", "reservations")
+
+
+def _add_summary(conn):
+    # JSON of the sweep's summary for the /sweeps history: the compact part
+    # in `summary`, the DETAIL_KEYS in `details`.
+    local_store.add_column(conn, "sweep_runs", "summary", "TEXT")
+    local_store.add_column(conn, "sweep_runs", "details", "TEXT")
+
+
+local_store.register_schema(_add_summary)
+
+
+def start(sweep: str, owner: str, status: str = "running") -> int:
+    with local_store.transaction() as conn:
+        cursor = conn.execute(
+            "INSERT INTO sweep_runs (sweep, owner, status, started_at) VALUES (?, ?, ?, ?)",
+            (sweep, owner, status, time.time())
+        )
+    return cursor.lastrowid
+
+
+def finish(run_id: int, status: str, error: str = None, summary: dict = None) -> None:
+    now = time.time()
+    details = None
+    if summary is not None:
+        details = json.dumps({key: summary[key] for key in DETAIL_KEYS if key in summary}, ensure_ascii=False)
+        summary = json.dumps({key: value for key, value in summary.items() if key not in DETAIL_KEYS},
+                             ensure_ascii=False)
+    with local_store.transaction() as conn:
+        conn.execute(
+            "UPDATE sweep_runs SET status = ?, finished_at = ?, duration = ? - started_at, error = ?, summary = ?, "
+            "details = ? WHERE id = ?",
+            (status, now, now, error, summary, details, run_id)
+        )
+
+
+def _row(row) -> dict:
+    run = dict(row)
+    details = run.pop("details", None)
+    if run.get("summary"):
+        run["summary"] = json.loads(run["summary"])
+        if details:
+            run["summary"].update(json.loads(details))
+    return run
+
+
+def get(run_id: int) -> dict:
+    row = local_store.connect().execute("SELECT * FROM sweep_runs WHERE id = ?", (run_id,)).fetchone()
+    return _row(row) if row else None
+
+
+def recent(sweep: str = None, limit: int = 50) -> list:
+    # Everything but `details`.
+    query = ("SELECT id, sweep, owner, status, started_at, finished_at, duration, error, summary "
+             "FROM sweep_runs")
+    params = ()
+    if sweep:
+        query += " WHERE sweep = ?"
+        params = (sweep,)
+    query += " ORDER BY started_at DESC LIMIT ?"
+    rows = local_store.connect().execute(query, (*params, limit)).fetchall()
+    return [_row(row) for row in rows]
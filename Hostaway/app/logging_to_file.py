@@ -1,31 +1,151 @@
+import atexit
+import copy
+import json
 import logging
+import queue
+import random
 import sys
 import os
+import threading
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+from app.settings import settings
 
+LOG_LEVEL = settings.log_level
+LOG_FORMAT = settings.log_format
+LOG_DIR = settings.log_dir
+LOG_MAX_BYTES = settings.log_max_bytes
+LOG_BACKUP_COUNT = settings.log_backup_count
+LOG_ROTATE_WHEN = settings.log_rotate_when
+LOG_QUEUE_SIZE = settings.log_queue_size
+LOG_DEBUG_SAMPLE_RATE = settings.log_debug_sample_rate
+WEB_WORKERS = settings.web_workers
 
-def setup_logger(name: str) -> logging.Logger:
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
+# Attributes passed through `extra=` that are worth keeping as JSON fields.
+CONTEXT_FIELDS = ("reservation_id", "sweep", "job_id", "event")
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name in CONTEXT_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SizedTimedRotatingFileHandler(TimedRotatingFileHandler):
+    # Rolls over at the time boundary or when the file grows past maxBytes,
+    # whichever comes first.
+    def __init__(self, filename: str, max_bytes: int, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.max_bytes = max_bytes
+
+    def shouldRollover(self, record: logging.LogRecord) -> int:
+        if super().shouldRollover(record):
+            return 1
+        if self.max_bytes > 0 and self.stream is not None:
+            self.stream.seek(0, 2)
+            if self.stream.tell() >= self.max_bytes:
+                return 1
+        return 0
+
+
+class DebugSampler(logging.Filter):
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    # Never waits on the queue: when the listener falls behind, records are
+    # dropped and counted instead of stalling the caller.
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
 
-    if logger.hasHandlers():
-        return logger
 
-    formatter = logging.Formatter(
+_lock = threading.Lock()
+_queue_handler = None
+_listener = None
+
+
+def _text_formatter() -> logging.Formatter:
+    return logging.Formatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
         datefmt='%m/%d/%Y %I:%M:%S %p'
     )
 
-    ch = logging.StreamHandler(stream=sys.stdout)
-    ch.setFormatter(formatter)
-    logger.addHandler(ch)
 
-    log_dir = os.path.join(os.path.dirname(__file__), 'logs')
-    os.makedirs(log_dir, exist_ok=True)
+def _get_queue_handler() -> QueueHandler:
+    global _queue_handler, _listener
+    with _lock:
+        if _queue_handler is not None:
+            return _queue_handler
+
+        formatter = JsonFormatter() if LOG_FORMAT == 'json' else _text_formatter()
+
+        ch = logging.StreamHandler(stream=sys.stdout)
+        ch.setFormatter(formatter)
+
+        os.makedirs(LOG_DIR, exist_ok=True)
+        # Rotation is not safe across processes, so each web worker gets its own file.
+        log_name = f'app-{os.getpid()}.log' if WEB_WORKERS > 1 else 'app.log'
+        log_path = os.path.join(LOG_DIR, log_name)
+        fh = SizedTimedRotatingFileHandler(
+            log_path, LOG_MAX_BYTES, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+        fh.setFormatter(formatter)
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        _queue_handler = NonBlockingQueueHandler(log_queue)
+        _queue_handler.addFilter(DebugSampler(LOG_DEBUG_SAMPLE_RATE))
+
+        _listener = QueueListener(log_queue, ch, fh)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        return _queue_handler
+
 
-    log_path = os.path.join(log_dir, 'app.log')
-    fh = logging.FileHandler(log_path, encoding='utf-8')
-    fh.setFormatter(formatter)
+def shutdown_logging() -> None:
+    # Drains whatever is still queued; safe to call more than once.
+    global _listener
+    with _lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
+def setup_logger(name: str) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.setLevel(LOG_LEVEL)
+
+    if logger.hasHandlers():
+        return logger
 
-    logger.addHandler(fh)
+    logger.addHandler(_get_queue_handler())
 
     return logger
@@ -1,16 +1,56 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.api.routes import router as api_router
+from app.services.slack_error_handler import notifier
+from app.services.delayed_jobs import pool as job_pool
+from app.services.webhook_ingest import ingest as webhook_ingest
+from app.services.outbox import sender as outbox_sender
+from app.services.http_client import client as http_client
+from app.services.templates import store as templates
+from app.db.reminder_ledger import replicator
+from app.services.scheduler import SCHEDULER_ENABLED, SchedulerLeader
+from app.services import traffic
+from app.logging_to_file import shutdown_logging
+from app.settings import settings
 
 import uvicorn
 
+WEB_WORKERS = settings.web_workers
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    templates.current()
+    notifier.start()
+    job_pool.start()
+    outbox_sender.start()
+    webhook_ingest.start()
+    replicator.start()
+    leader = SchedulerLeader()
+    if SCHEDULER_ENABLED:
+        leader.start()
+    yield
+    await leader.stop()
+    await webhook_ingest.stop()
+    await job_pool.stop()
+    await outbox_sender.stop()
+    await replicator.stop()
+    await traffic.shutdown()
+    await asyncio.to_thread(notifier.shutdown)
+    await asyncio.to_thread(http_client.close)
+    shutdown_logging()
+
+
 app = FastAPI(
     title="Hostaway Reservation Service",
     description="API to check and list Hostaway reservations",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.include_router(api_router)
 
 if __name__ == "__main__":
     print("🚀 Server running at: http://localhost:8000")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, workers=WEB_WORKERS)
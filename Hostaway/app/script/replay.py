@@ -0,0 +1,154 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# Replays a recorded sweep (see app/services/traffic.py) with nothing going
+# out and writes a per-reservation decision report:
+#
+#   python -m app.script.replay data/traffic/arrivals-20250601T080100.jsonl.gz --report before.json
+#   python -m app.script.replay --compare before.json after.json
+#
+# The service is imported only after its settings point at a throwaway local
+# database, so the replay never touches the real state.
+
+
+def configure_env(workdir: str) -> None:
+    os.environ.update({
+        "LOCAL_DB_PATH": os.path.join(workdir, "state.db"),
+        "LOG_DIR": os.path.join(workdir, "logs"),
+        "LOG_LEVEL": os.getenv("REPLAY_LOG_LEVEL", "ERROR"),
+        "SCHEDULER_ENABLED": "0",
+        "TRAFFIC_RECORD_DIR": "",
+    })
+
+
+def outbox_messages() -> list:
+    from app.db import local_store
+
+    rows = local_store.connect().execute(
+        "SELECT reservation_id, action, step, country, status, attempts FROM outbox ORDER BY id"
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+async def replay(recording: dict, latency: bool) -> dict:
+    from app.services import clock, traffic
+    from app.services.http_client import client as http_client
+    from app.services.outbox import sender as outbox_sender
+    from app.services.scheduler import run_sweep
+    from app.services.templates import store as templates
+
+    meta = recording["meta"]
+    clock.freeze(datetime.fromisoformat(meta["recorded_at"]))
+    await asyncio.to_thread(traffic.restore_state, recording["state"])
+    replayer = traffic.Replayer(recording["http"], latency)
+    http_client.replayer = replayer
+
+    started = time.perf_counter()
+    result = await run_sweep(meta["sweep"])
+    sweep_seconds = time.perf_counter() - started
+    # Deliver what the sweep queued; sends are answered from the recording.
+    while await outbox_sender.send_batch():
+        pass
+
+    index = templates.current()
+    reservations = {
+        str(id): {"outcome": outcome, "messages": []}
+        for id, outcome in result.get("summary", {}).get("reservations", {}).items()
+    }
+    for row in await asyncio.to_thread(outbox_messages):
+        entry = reservations.setdefault(str(row["reservation_id"]), {"outcome": None, "messages": []})
+        entry["messages"].append({
+            "action": row["action"],
+            "step": row["step"],
+            "language": row["country"],
+            "template_id": index.resolve(row["action"], row["step"], row["country"]),
+            "delivery": row["status"],
+        })
+
+    return {
+        "sweep": meta["sweep"],
+        "recorded_at": meta["recorded_at"],
+        "replayed_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "status_code": result.get("status_code"),
+        "sweep_seconds": round(sweep_seconds, 4),
+        "requests": dict(replayer.stats),
+        "counts": result.get("summary", {}).get("counts", {}),
+        "reservations": reservations,
+    }
+
+
+async def run(path: str, latency: bool) -> dict:
+    from app.logging_to_file import shutdown_logging
+    from app.services import traffic
+    from app.services.http_client import client as http_client
+    from app.services.slack_error_handler import notifier
+
+    try:
+        return await replay(await asyncio.to_thread(traffic.load, path), latency)
+    finally:
+        await asyncio.to_thread(notifier.shutdown)
+        await asyncio.to_thread(http_client.close)
+        shutdown_logging()
+
+
+def decisions(entry: dict) -> tuple:
+    # Delivery status is left out: it depends on recorded Wazzup answers,
+    # not on what the sweep decided.
+    return entry["outcome"], [
+        (m["action"], m["step"], m["language"], m["template_id"]) for m in entry["messages"]
+    ]
+
+
+def compare(old_path: str, new_path: str) -> int:
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    changed = 0
+    for id in sorted(set(old["reservations"]) | set(new["reservations"]), key=int):
+        before = old["reservations"].get(id)
+        after = new["reservations"].get(id)
+        if before is not None and after is not None and decisions(before) == decisions(after):
+            continue
+        changed += 1
+        print(f"{id}: {decisions(before) if before else 'absent'} -> {decisions(after) if after else 'absent'}")
+
+    print(f"{changed} of {len(new['reservations'])} reservations decided differently; "
+          f"sweep {old['sweep_seconds']:.3f}s -> {new['sweep_seconds']:.3f}s")
+    return 1 if changed else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay a recorded sweep without sending anything")
+    parser.add_argument("recording", nargs="?")
+    parser.add_argument("--report", default="replay-report.json")
+    parser.add_argument("--latency", action="store_true", help="wait for the recorded response times")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare(*args.compare)
+    if not args.recording:
+        parser.error("a recording is required")
+
+    with tempfile.TemporaryDirectory(prefix="hostaway-replay-") as workdir:
+        configure_env(workdir)
+        report = asyncio.run(run(args.recording, args.latency))
+
+    report["recording"] = args.recording
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"{report['sweep']}: {sum(report['counts'].values())} reservations, {report['counts']}, "
+          f"requests {report['requests']}; report written to {args.report}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,81 +1,42 @@
-import requests
-import os
-import json
-import pytz
-import time
-from apscheduler.schedulers.background import BackgroundScheduler
-from pytz import timezone
-from ..logging_to_file import setup_logger
-from ..services.slack_error_handler import error_notifications
+import asyncio
+import signal
+from ..logging_to_file import setup_logger, shutdown_logging
+from ..services.slack_error_handler import notifier
+from ..services.http_client import client as http_client
+from ..services.scheduler import SchedulerLeader
+from ..db.reminder_ledger import replicator
+from ..services.outbox import sender as outbox_sender
+from ..services import traffic
 
 logger = setup_logger(__name__)
-session = requests.Session()
-scheduler = BackgroundScheduler()
-spain_tz = timezone('Europe/Madrid')
 
-session.headers.update({
-    'Authorization': f"Bearer {os.getenv('HOSTAWAY_API_KEY')}",
-    'Cache-control': "no-cache"
-})
 
-
-def visit_verification_endpoint():
-    try:
-        response = session.get("http://web:8003/check_verifications")
-        data = response.json()
-        pretty = json.dumps(data, indent=4, ensure_ascii=False)
-        error_notifications(f"Visited endpoint, response:\n{pretty}")
-        logger.info(f"Visited endpoint, response:\n{pretty}")
-    except Exception as e:
-        error_notifications(f"Error visiting endpoint: {e}")
-        logger.error(f"Error visiting endpoint: {e}")
-
-
-def visit_arrivals_endpoint():
-    try:
-        response = session.get("http://web:8003/check_arrivals")
-        data = response.json()
-        pretty = json.dumps(data, indent=4, ensure_ascii=False)
-        error_notifications(f"Visited endpoint, response:\n{pretty}")
-        logger.info(f"Visited endpoint, response:\n{pretty}")
-    except Exception as e:
-        error_notifications(f"Error visiting endpoint: {e}")
-        logger.error(f"Error visiting endpoint: {e}")
-
-
-def schedule_jobs():
-    logger.info("Scheduling background jobs...")
-
-    scheduler.add_job(
-        visit_verification_endpoint,
-        'cron',
-        hour='10,13,18',
-        timezone=spain_tz,
-        id="visit_verification",
-        replace_existing=True
-    )
-    logger.info("Scheduled job: visit_verification")
-
-    scheduler.add_job(
-        visit_arrivals_endpoint,
-        'cron',
-        hour='10,13,18',
-        minute=1,
-        timezone=spain_tz,
-        id="visit_checkout",
-        replace_existing=True
-    )
-    logger.info("Scheduled job: visit_arrivals")
-
-
-if __name__ == "__main__":
+# Dedicated scheduler worker. The web service runs the same scheduler in
+# process when SCHEDULER_ENABLED=1; the scheduler lease makes sure only one
+# process fires the cron triggers at a time.
+async def main():
     logger.info("Scheduler process starting...")
-    schedule_jobs()
-    scheduler.start()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    leader = SchedulerLeader()
+    leader.start()
+    replicator.start()
+    outbox_sender.start()
     try:
-        while True:
-            time.sleep(60)
-    except (KeyboardInterrupt, SystemExit):
-        scheduler.shutdown()
+        await stop.wait()
+    finally:
+        await leader.stop()
+        await outbox_sender.stop()
+        await replicator.stop()
+        await traffic.shutdown()
+        await asyncio.to_thread(notifier.shutdown)
+        await asyncio.to_thread(http_client.close)
         logger.info("Scheduler shut down.")
+        shutdown_logging()
+
 
+if __name__ == "__main__":
+    asyncio.run(main())
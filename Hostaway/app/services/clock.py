@@ -0,0 +1,24 @@
+from datetime import date, datetime
+
+# Wall clock used by the sweeps. A replay freezes it at the time the traffic
+# was recorded, so the same reservations fall inside the same windows.
+_frozen = None
+
+
+def freeze(at: datetime) -> None:
+    global _frozen
+    _frozen = at
+
+
+def now(tz=None) -> datetime:
+    if _frozen is None:
+        return datetime.now(tz)
+    if tz is None:
+        return _frozen.astimezone().replace(tzinfo=None)
+    return _frozen.astimezone(tz)
+
+
+def today(tz=None) -> date:
+    # Pass the business time zone: the container runs on UTC, and at 00:01 in
+    # Madrid its local date is still yesterday.
+    return now(tz).date()
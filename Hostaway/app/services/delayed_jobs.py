@@ -0,0 +1,232 @@
+import asyncio
+import inspect
+import json
+import time
+from app.db import local_store
+from app.logging_to_file import setup_logger
+from app.services.slack_error_handler import error_notifications
+from app.settings import settings
+
+logger = setup_logger(__name__)
+
+JOB_WORKERS = settings.job_workers
+JOB_POLL_INTERVAL = settings.job_poll_interval
+JOB_LEASE_SECONDS = settings.job_lease_seconds
+JOB_MAX_ATTEMPTS = settings.job_max_attempts
+
+local_store.register_schema("""
+CREATE TABLE IF NOT EXISTS delayed_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    run_at REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS delayed_jobs_due ON delayed_jobs (status, run_at);
+""")
+
+
+def _add_job_key(conn):
+    # Keyed jobs can be re-planned: scheduling the same key again moves the
+    # existing job instead of adding a second one.
+    local_store.add_column(conn, "delayed_jobs", "key", "TEXT")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS delayed_jobs_key ON delayed_jobs (key) WHERE key IS NOT NULL")
+
+
+local_store.register_schema(_add_job_key)
+
+handlers = {}
+
+
+class Reschedule(Exception):
+    # Raised by a handler that ran too early; the job is put back for run_at.
+    def __init__(self, run_at: float):
+        super().__init__(f"rescheduled for {run_at}")
+        self.run_at = run_at
+
+
+def job(kind: str):
+    def decorator(func):
+        handlers[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(kind: str, payload: dict, delay_seconds: float = 0) -> int:
+    now = time.time()
+    with local_store.transaction() as conn:
+        cursor = conn.execute(
+            "INSERT INTO delayed_jobs (kind, payload, run_at, created_at) VALUES (?, ?, ?, ?)",
+            (kind, json.dumps(payload), now + delay_seconds, now)
+        )
+    return cursor.lastrowid
+
+
+def schedule(kind: str, key: str, payload: dict, run_at: float) -> int:
+    now = time.time()
+    with local_store.transaction() as conn:
+        cursor = conn.execute(
+            "INSERT INTO delayed_jobs (kind, key, payload, run_at, created_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(key) WHERE key IS NOT NULL DO UPDATE SET kind = excluded.kind, payload = excluded.payload, "
+            "run_at = excluded.run_at, status = 'pending', attempts = 0, lease_until = NULL, last_error = NULL "
+            "WHERE delayed_jobs.status != 'running' "
+            "RETURNING id",
+            (kind, key, json.dumps(payload), run_at, now)
+        )
+        row = cursor.fetchone()
+    pool.notify_threadsafe()
+    return row[0] if row else None
+
+
+def cancel(key: str) -> None:
+    with local_store.transaction() as conn:
+        conn.execute("DELETE FROM delayed_jobs WHERE key = ? AND status != 'running'", (key,))
+
+
+def next_run_at():
+    row = local_store.connect().execute(
+        "SELECT MIN(run_at) FROM delayed_jobs WHERE status = 'pending'"
+    ).fetchone()
+    return row[0]
+
+
+def claim_due_job():
+    # A 'running' job whose lease has expired belongs to a worker that died
+    # (e.g. a container restart) and is picked up again.
+    now = time.time()
+    with local_store.transaction() as conn:
+        row = conn.execute(
+            "SELECT id, kind, payload, attempts FROM delayed_jobs "
+            "WHERE (status = 'pending' AND run_at <= ?) OR (status = 'running' AND lease_until < ?) "
+            "ORDER BY run_at LIMIT 1",
+            (now, now)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE delayed_jobs SET status = 'running', attempts = attempts + 1, lease_until = ? WHERE id = ?",
+            (now + JOB_LEASE_SECONDS, row["id"])
+        )
+    return dict(row)
+
+
+def complete_job(job_id: int) -> None:
+    with local_store.transaction() as conn:
+        conn.execute("DELETE FROM delayed_jobs WHERE id = ?", (job_id,))
+
+
+def fail_job(job_id: int, attempts: int, error: str) -> None:
+    with local_store.transaction() as conn:
+        if attempts >= JOB_MAX_ATTEMPTS:
+            conn.execute(
+                "UPDATE delayed_jobs SET status = 'failed', last_error = ?, lease_until = NULL WHERE id = ?",
+                (error, job_id)
+            )
+        else:
+            conn.execute(
+                "UPDATE delayed_jobs SET status = 'pending', last_error = ?, lease_until = NULL, run_at = ? "
+                "WHERE id = ?",
+                (error, time.time() + 60 * 2 ** attempts, job_id)
+            )
+
+
+def prune_failed(before: float) -> int:
+    # `run_at` of a failed job is when its last attempt was due.
+    with local_store.transaction() as conn:
+        cursor = conn.execute("DELETE FROM delayed_jobs WHERE status = 'failed' AND run_at < ?", (before,))
+    return cursor.rowcount
+
+
+def reschedule_job(job_id: int, run_at: float) -> None:
+    with local_store.transaction() as conn:
+        conn.execute(
+            "UPDATE delayed_jobs SET status = 'pending', attempts = 0, lease_until = NULL, run_at = ? WHERE id = ?",
+            (run_at, job_id)
+        )
+
+
+def pending_count() -> int:
+    row = local_store.connect().execute(
+        "SELECT COUNT(*) FROM delayed_jobs WHERE status IN ('pending', 'running')"
+    ).fetchone()
+    return row[0]
+
+
+class JobWorkerPool:
+    def __init__(self, workers: int = JOB_WORKERS, poll_interval: float = JOB_POLL_INTERVAL):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+        self._loop = None
+
+    def start(self):
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run(n)) for n in range(self.workers)]
+        logger.info(f"Started {self.workers} delayed job workers")
+
+    def notify(self):
+        self._wakeup.set()
+
+    def notify_threadsafe(self):
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self, n: int):
+        while True:
+            try:
+                claimed = await asyncio.to_thread(claim_due_job)
+            except Exception as e:
+                logger.error(f"Job worker {n} failed to claim a job: {e}", exc_info=True)
+                claimed = None
+
+            if claimed is None:
+                # Sleep until the earliest pending job is due, so timed jobs
+                # fire on time rather than on the next poll.
+                self._wakeup.clear()
+                timeout = self.poll_interval
+                try:
+                    run_at = await asyncio.to_thread(next_run_at)
+                    if run_at is not None:
+                        timeout = min(timeout, max(0.05, run_at - time.time()))
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._execute(claimed)
+
+    async def _execute(self, claimed: dict):
+        handler = handlers.get(claimed["kind"])
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job kind {claimed['kind']}")
+            payload = json.loads(claimed["payload"])
+            if inspect.iscoroutinefunction(handler):
+                await handler(**payload)
+            else:
+                await asyncio.to_thread(handler, **payload)
+            await asyncio.to_thread(complete_job, claimed["id"])
+        except Reschedule as e:
+            await asyncio.to_thread(reschedule_job, claimed["id"], e.run_at)
+        except Exception as e:
+            logger.error(f"Job {claimed['id']} ({claimed['kind']}) failed: {e}", exc_info=True,
+                         extra={"job_id": claimed["id"]})
+            error_notifications(f"Job {claimed['id']} ({claimed['kind']}) failed: {e}")
+            await asyncio.to_thread(fail_job, claimed["id"], claimed["attempts"] + 1, str(e))
+
+
+pool = JobWorkerPool()
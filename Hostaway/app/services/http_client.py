@@ -0,0 +1,263 @@
+import asyncio
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from multidict import CIMultiDict
+from app.logging_to_file import setup_logger
+from app.services import metrics, traffic
+from app.services.resilience import CircuitBreaker, CircuitOpenError, RateLimiter, retry_after_seconds
+from app.settings import settings
+
+logger = setup_logger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+WEB_WORKERS = settings.web_workers
+
+
+@dataclass(frozen=True)
+class ProviderConfig:
+    limit_per_host: int = 10
+    connect_timeout: float = 5
+    read_timeout: float = 30
+    total_timeout: float = 60
+    attempts: int = 3
+    retry_methods: frozenset = frozenset({"GET"})
+    rate_per_second: float = None  # None: only slowed down by 429s
+    burst: int = 1
+    failure_threshold: int = 5
+    reset_timeout: float = 30
+
+
+def _worker_share(rate):
+    # Rate limits are per process; with several web workers each one gets
+    # an equal share so the provider still sees the configured total.
+    return rate / WEB_WORKERS if rate else rate
+
+
+# POSTs are not retried: a Wazzup send or a NocoDB insert may have gone
+# through even when the response was lost.
+PROVIDERS = {
+    "hostaway": ProviderConfig(
+        limit_per_host=settings.hostaway_max_connections,
+        read_timeout=settings.hostaway_read_timeout,
+        rate_per_second=_worker_share(settings.hostaway_rate_per_second),
+        burst=settings.hostaway_burst,
+    ),
+    "nocodb": ProviderConfig(
+        limit_per_host=settings.nocodb_max_connections,
+        read_timeout=settings.nocodb_read_timeout,
+        total_timeout=30,
+        rate_per_second=_worker_share(settings.nocodb_rate_per_second),
+        burst=settings.nocodb_burst,
+    ),
+    "wazzup": ProviderConfig(
+        limit_per_host=settings.wazzup_max_connections,
+        read_timeout=settings.wazzup_read_timeout,
+        total_timeout=20,
+        attempts=1,
+        rate_per_second=_worker_share(settings.wazzup_rate_per_second),
+        burst=settings.wazzup_burst,
+    ),
+    "slack": ProviderConfig(
+        limit_per_host=2, connect_timeout=3, read_timeout=10, total_timeout=15, attempts=1,
+        rate_per_second=_worker_share(1), burst=1, failure_threshold=3, reset_timeout=60,
+    ),
+}
+
+
+class HttpError(Exception):
+    def __init__(self, response: "HttpResponse"):
+        super().__init__(f"{response.status_code} error for url: {response.url}")
+        self.response = response
+
+
+@dataclass
+class HttpResponse:
+    status_code: int
+    url: str
+    content: bytes = b""
+    headers: dict = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            raise HttpError(self)
+
+
+async def _anext(agen):
+    return await agen.__anext__()
+
+
+async def _aclose(agen):
+    await agen.aclose()
+
+
+class AsyncHttpClient:
+    # All sessions live on one background event loop, so the connection pools
+    # are shared by async callers (the uvicorn loop, job workers) and by sync
+    # callers (threadpool routes, the Slack worker) alike.
+    def __init__(self, providers: dict):
+        self.providers = providers
+        self._clients = {}
+        self.breakers = {
+            name: CircuitBreaker(name, config.failure_threshold, config.reset_timeout)
+            for name, config in providers.items()
+        }
+        self.limiters = {name: RateLimiter(config.rate_per_second, config.burst) for name, config in providers.items()}
+        self.replayer = None  # a traffic.Replayer answers every request instead of the network
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="http-client", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def _client(self, provider: str) -> "RetryClient":
+        client = self._clients.get(provider)
+        if client is None:
+            # aiohttp is imported on first use, off the start-up path.
+            import aiohttp
+            from aiohttp_retry import ExponentialRetry, RetryClient
+
+            config = self.providers[provider]
+            connector = aiohttp.TCPConnector(
+                limit_per_host=config.limit_per_host, keepalive_timeout=30, ttl_dns_cache=300
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=config.total_timeout, sock_connect=config.connect_timeout, sock_read=config.read_timeout
+            )
+            retry_options = ExponentialRetry(
+                attempts=config.attempts,
+                statuses=RETRY_STATUSES,
+                methods=set(config.retry_methods),
+                exceptions={aiohttp.ClientConnectionError, asyncio.TimeoutError},
+            )
+            session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            client = RetryClient(client_session=session, retry_options=retry_options)
+            self._clients[provider] = client
+        return client
+
+    async def _request(self, provider: str, method: str, url: str, operation: str = None, **kwargs) -> HttpResponse:
+        import aiohttp
+
+        # `operation` only names the call in metrics, e.g. list vs by-id.
+        labels = {"provider": provider, "operation": operation or method}
+        if self.replayer is not None:
+            status, content, headers = await self.replayer.respond(provider, method, url, kwargs)
+            return HttpResponse(status, url, content, CIMultiDict(headers))
+
+        # The caller's context (and so its sweep's recorder) carries over
+        # run_coroutine_threadsafe onto this loop.
+        recording = traffic.recording() and provider not in traffic.UNRECORDED
+        started = time.monotonic()
+        breaker, limiter = self.breakers[provider], self.limiters[provider]
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            metrics.OUTBOUND_REQUESTS.inc(status="circuit_open", **labels)
+            raise
+
+        status = "error"
+        try:
+            await limiter.acquire()
+            with metrics.OUTBOUND_SECONDS.time(**labels):
+                async with self._client(provider).request(method, url, **kwargs) as response:
+                    content = await response.read()
+                    status = response.status
+                    result = HttpResponse(response.status, str(response.url), content, CIMultiDict(response.headers))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            breaker.record_failure()
+            metrics.CIRCUIT_OPEN.set(int(breaker.state != CircuitBreaker.CLOSED), provider=provider)
+            if recording:
+                traffic.record(provider, method, url, operation, kwargs, time.monotonic() - started, error=e)
+            raise
+        finally:
+            metrics.OUTBOUND_REQUESTS.inc(status=status, **labels)
+            if status == "error" or status >= 400:
+                metrics.OUTBOUND_ERRORS.inc(**labels)
+
+        if recording:
+            traffic.record(provider, method, url, operation, kwargs, time.monotonic() - started,
+                           status, result.content, result.headers)
+
+        # A 429 slows this provider down but is not a sign it is failing;
+        # 5xx responses count towards opening the circuit.
+        if status == 429:
+            limiter.throttle(retry_after_seconds(result.headers))
+            breaker.record_success()
+        elif status >= 500:
+            breaker.record_failure()
+        else:
+            limiter.record_success()
+            breaker.record_success()
+        metrics.CIRCUIT_OPEN.set(int(breaker.state != CircuitBreaker.CLOSED), provider=provider)
+        return result
+
+    async def request(self, provider: str, method: str, url: str, **kwargs) -> HttpResponse:
+        loop = self.loop
+        coro = self._request(provider, method, url, **kwargs)
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    async def get(self, provider: str, url: str, **kwargs) -> HttpResponse:
+        return await self.request(provider, "GET", url, **kwargs)
+
+    async def post(self, provider: str, url: str, **kwargs) -> HttpResponse:
+        return await self.request(provider, "POST", url, **kwargs)
+
+    def run_sync(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def iterate_sync(self, agen):
+        # Drive an async generator on the client loop from synchronous code;
+        # tasks the generator starts keep running between items.
+        try:
+            while True:
+                try:
+                    yield self.run_sync(_anext(agen))
+                except StopAsyncIteration:
+                    return
+        finally:
+            self.run_sync(_aclose(agen))
+
+    def get_sync(self, provider: str, url: str, **kwargs) -> HttpResponse:
+        return self.run_sync(self._request(provider, "GET", url, **kwargs))
+
+    def post_sync(self, provider: str, url: str, **kwargs) -> HttpResponse:
+        return self.run_sync(self._request(provider, "POST", url, **kwargs))
+
+    async def _close_clients(self):
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.close()
+
+    def close(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None or loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self._close_clients(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join(5)
+        loop.close()
+
+
+client = AsyncHttpClient(PROVIDERS)
@@ -0,0 +1,135 @@
+import asyncio
+import threading
+from dataclasses import dataclass
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from app.db import listing_cache
+from app.logging_to_file import setup_logger
+from app.services import clock
+from app.services.http_client import client as http
+from app.services.slack_error_handler import error_notifications
+from app.settings import settings
+
+logger = setup_logger(__name__)
+
+HOSTAWAY_API_URL = settings.hostaway_api_url
+LISTINGS_URL = f"{HOSTAWAY_API_URL}/listings"
+LISTING_PAGE_LIMIT = settings.listing_page_limit
+LISTING_CACHE_TTL = settings.listing_cache_ttl
+# Listing custom field holding the language guests of that property are
+# written to when their own country has no templates.
+LISTING_LANGUAGE_FIELD = settings.listing_language_field
+
+HOSTAWAY_HEADERS = {
+    'Authorization': f"Bearer {settings.hostaway_api_key}",
+}
+
+
+@dataclass(slots=True, frozen=True)
+class Listing:
+    id: int
+    check_in_hour: int
+    timezone: ZoneInfo
+    language: str
+
+    @classmethod
+    def from_api(cls, data: dict) -> "Listing":
+        check_in_hour = data.get("checkInTimeStart")
+        check_in_hour = int(check_in_hour) if check_in_hour not in (None, "") else None
+
+        timezone = None
+        if data.get("timeZoneName"):
+            try:
+                timezone = ZoneInfo(data["timeZoneName"])
+            except (ZoneInfoNotFoundError, ValueError):
+                logger.warning(f"Listing {data.get('id')} has unknown time zone {data['timeZoneName']!r}")
+
+        language = None
+        for f in data.get("customFieldValues") or []:
+            if (f.get("customField") or {}).get("name") == LISTING_LANGUAGE_FIELD and f.get("value"):
+                language = str(f["value"]).strip().upper()
+
+        return cls(id=int(data["id"]), check_in_hour=check_in_hour, timezone=timezone, language=language)
+
+
+class ListingDirectory:
+    # In-memory index of the listing cache. `ensure_fresh` re-lists the
+    # listings from Hostaway once the cache is older than the TTL, sending the
+    # stored ETag of every page so unchanged pages come back as 304. Lookups
+    # never go to the network; a failed refresh keeps the stale metadata.
+    def __init__(self, ttl: float = LISTING_CACHE_TTL):
+        self.ttl = ttl
+        self._by_id = {}
+        self._loaded_at = None
+        self._refreshing = threading.Lock()
+
+    def get(self, listing_id):
+        if listing_id is None:
+            return None
+        try:
+            return self._by_id.get(int(listing_id))
+        except (TypeError, ValueError):
+            return None
+
+    async def ensure_fresh(self) -> None:
+        refreshed_at = await asyncio.to_thread(listing_cache.refreshed_at)
+        if refreshed_at is None or clock.now().timestamp() - refreshed_at >= self.ttl:
+            # Only one refresh per process; others go on with what is cached.
+            if self._refreshing.acquire(blocking=False):
+                try:
+                    await self.refresh()
+                except Exception as e:
+                    logger.error(f"Failed to refresh listings: {e}", exc_info=True)
+                    error_notifications(f"Failed to refresh listings, using cached metadata: {e}")
+                finally:
+                    self._refreshing.release()
+                refreshed_at = await asyncio.to_thread(listing_cache.refreshed_at)
+
+        # Another worker may have refreshed the shared cache.
+        if refreshed_at != self._loaded_at:
+            await asyncio.to_thread(self._load, refreshed_at)
+
+    async def refresh(self) -> None:
+        offset, fetched, unchanged = 0, 0, 0
+        while True:
+            stored = await asyncio.to_thread(listing_cache.page, offset)
+            headers = dict(HOSTAWAY_HEADERS)
+            if stored and stored[0]:
+                headers['If-None-Match'] = stored[0]
+
+            response = await http.get(
+                "hostaway", f"{LISTINGS_URL}?limit={LISTING_PAGE_LIMIT}&offset={offset}",
+                headers=headers, operation="list_listings"
+            )
+            if response.status_code == 304 and stored:
+                await asyncio.to_thread(listing_cache.touch_page, offset)
+                size, limit = stored[1], LISTING_PAGE_LIMIT
+                unchanged += 1
+            else:
+                response.raise_for_status()
+                page = response.json()
+                result = page.get("result") or []
+                await asyncio.to_thread(listing_cache.put_page, offset, result, response.headers.get("ETag"))
+                size, limit = len(result), page.get("limit") or LISTING_PAGE_LIMIT
+                fetched += 1
+
+            offset += limit
+            if size < limit:
+                break
+
+        await asyncio.to_thread(listing_cache.drop_pages_from, offset)
+        logger.info(f"Refreshed listings: {fetched} pages fetched, {unchanged} unchanged")
+
+    def _load(self, refreshed_at) -> None:
+        by_id = {}
+        for data in listing_cache.all_listings():
+            try:
+                listing = Listing.from_api(data)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Skipping malformed listing {data.get('id')}: {e}")
+                continue
+            by_id[listing.id] = listing
+        self._by_id = by_id
+        self._loaded_at = refreshed_at
+
+
+directory = ListingDirectory()
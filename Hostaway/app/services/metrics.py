@@ -0,0 +1,183 @@
+import asyncio
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Minimal Prometheus text-format metrics. Everything lives in this process;
+# values are updated from the uvicorn loop, the HTTP client loop and worker
+# threads, hence the per-metric locks.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _render_value(self, key, value) -> list:
+        return [f"{self.name}{_labels(self.label_names, key)} {value}"]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), collect=None):
+        super().__init__(name, help, labels)
+        # Optional callable read at scrape time instead of stored values.
+        self.collect = collect
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self) -> list:
+        if self.collect is not None:
+            self.set(self.collect())
+        return super().render()
+
+    def _render_value(self, key, value) -> list:
+        return [f"{self.name}{_labels(self.label_names, key)} {value}"]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_value(self, key, value) -> list:
+        counts, total, count = value
+        lines = []
+        for bound, n in zip(self.buckets, counts):
+            le = 'le="%s"' % bound
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {n}")
+        le = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {count}")
+        lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {total}")
+        lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+
+def timed(histogram: Histogram, errors: Counter = None, **labels):
+    # Records the duration of every call, and counts the ones that raised.
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with histogram.time(**labels):
+                    try:
+                        return await func(*args, **kwargs)
+                    except Exception:
+                        if errors is not None:
+                            errors.inc(**labels)
+                        raise
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with histogram.time(**labels):
+                    try:
+                        return func(*args, **kwargs)
+                    except Exception:
+                        if errors is not None:
+                            errors.inc(**labels)
+                        raise
+        return wrapper
+    return decorator
+
+
+def render() -> str:
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+OUTBOUND_SECONDS = Histogram(
+    "outbound_request_seconds", "Latency of outbound HTTP calls, retries included.", ("provider", "operation")
+)
+OUTBOUND_REQUESTS = Counter(
+    "outbound_requests_total", "Outbound HTTP calls by response status.", ("provider", "operation", "status")
+)
+OUTBOUND_ERRORS = Counter(
+    "outbound_errors_total", "Outbound HTTP calls that failed or returned an error status.", ("provider", "operation")
+)
+SWEEP_SECONDS = Histogram("sweep_seconds", "Duration of a sweep run.", ("sweep",))
+SWEEP_RUNS = Counter("sweep_runs_total", "Sweep runs by outcome.", ("sweep", "status"))
+WEBHOOK_SECONDS = Histogram(
+    "webhook_handler_seconds", "Time spent in the webhook handler.", ("stage",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+WEBHOOK_ERRORS = Counter("webhook_handler_errors_total", "Webhook handler calls that raised.", ("stage",))
+WEBHOOK_EVENTS = Counter("webhook_events_total", "Webhook events by ingestion outcome.", ("outcome",))
+CIRCUIT_OPEN = Gauge("circuit_open", "1 while a provider's circuit breaker is not closed.", ("provider",))
+MESSAGES_SENT = Counter(
+    "messages_sent_total", "Wazzup template messages by action, step, language and result.",
+    ("action", "step", "language", "result")
+)
@@ -0,0 +1,313 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from uuid import uuid4
+import app.db.reminder_ledger as ledger
+from app.db import local_store, reservation_state
+from app.logging_to_file import setup_logger
+from app.services import delayed_jobs, metrics, traffic
+from app.services.pre_check_in_wazzup import PERMANENT_FAILURES, SENT, send_message_async
+from app.services.slack_error_handler import error_notifications
+from app.services.templates import store as templates
+from app.settings import settings
+
+logger = setup_logger(__name__)
+
+OUTBOX_BATCH = settings.outbox_batch
+OUTBOX_CONCURRENCY = settings.outbox_concurrency
+OUTBOX_POLL_INTERVAL = settings.outbox_poll_interval
+OUTBOX_LEASE_SECONDS = settings.outbox_lease_seconds
+OUTBOX_MAX_ATTEMPTS = settings.outbox_max_attempts
+OUTBOX_RETRY_BASE = settings.outbox_retry_base
+OUTBOX_RETRY_MAX = 60 * 60
+ORPHAN_CLAIM_AGE = 10 * 60
+HOUSEKEEPING_INTERVAL = 60
+OUTBOX_RETENTION = settings.outbox_retention_days * 24 * 60 * 60
+
+local_store.register_schema("""
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    reservation_id INTEGER NOT NULL,
+    phone TEXT,
+    country TEXT,
+    action TEXT NOT NULL,
+    step INTEGER NOT NULL,
+    ledger_kind TEXT,
+    ledger_step INTEGER,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    lease_until REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+""")
+
+
+def _add_message_key(conn):
+    # Sent to Wazzup as crmMessageId with every attempt of the entry. A
+    # random key rather than the row id, which restarts with a new database.
+    local_store.add_column(conn, "outbox", "message_key", "TEXT")
+
+
+local_store.register_schema(_add_message_key)
+
+
+def _add_recording(conn):
+    # Name of the traffic recording of the sweep that queued the entry.
+    local_store.add_column(conn, "outbox", "recording", "TEXT")
+
+
+local_store.register_schema(_add_recording)
+
+
+@dataclass(slots=True, frozen=True)
+class Message:
+    reservation_id: int
+    phone: str
+    country: str
+    action: str
+    step: int
+    # The reminder ledger step this delivery confirms, if any.
+    ledger_kind: str = None
+    ledger_step: int = None
+
+
+def add(messages: list) -> None:
+    # Actions without a single template could never be delivered; they are
+    # not queued, and their ledger steps are given back.
+    index = templates.current()
+    unsendable = [m for m in messages if not index.has_action(m.action)]
+    for m in unsendable:
+        logger.warning(f"{m.reservation_id} - no templates for {m.action}, message not queued",
+                       extra={"reservation_id": m.reservation_id})
+
+    recorder = traffic.current()
+    recording = recorder.name if recorder is not None else None
+    now = time.time()
+    with local_store.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO outbox (reservation_id, phone, country, action, step, ledger_kind, ledger_step, "
+            "message_key, recording, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(m.reservation_id, m.phone, m.country, m.action, m.step, m.ledger_kind, m.ledger_step,
+              uuid4().hex, recording, now, now)
+             for m in messages if index.has_action(m.action)]
+        )
+        ledger.release(conn, [(m.reservation_id, m.ledger_kind, m.ledger_step) for m in unsendable if m.ledger_kind])
+
+
+async def add_async(messages: list) -> None:
+    if not messages:
+        return
+    await asyncio.to_thread(add, messages)
+    sender.notify_threadsafe()
+
+
+def claim_due(limit: int) -> list:
+    # A 'sending' entry whose lease ran out belongs to a sender that died
+    # mid-batch and is picked up again.
+    now = time.time()
+    with local_store.transaction() as conn:
+        rows = conn.execute(
+            "SELECT * FROM outbox WHERE (status = 'pending' AND next_attempt_at <= ?) "
+            "OR (status = 'sending' AND lease_until < ?) ORDER BY next_attempt_at LIMIT ?",
+            (now, now, limit)
+        ).fetchall()
+        conn.executemany(
+            "UPDATE outbox SET status = 'sending', attempts = attempts + 1, lease_until = ? WHERE id = ?",
+            [(now + OUTBOX_LEASE_SECONDS, row["id"]) for row in rows]
+        )
+    return [dict(row, attempts=row["attempts"] + 1) for row in rows]
+
+
+def record_results(sent: list, failed: list) -> list:
+    # Delivery state and reminder ledger change in one transaction: a step
+    # counts only once its message went out, and is released if it never does.
+    now = time.time()
+    with local_store.transaction() as conn:
+        conn.executemany(
+            "UPDATE outbox SET status = 'sent', sent_at = ?, lease_until = NULL, last_error = NULL WHERE id = ?",
+            [(now, row["id"]) for row in sent]
+        )
+        ledger.confirm(conn, [(row["reservation_id"], row["ledger_kind"], row["ledger_step"])
+                              for row in sent if row["ledger_kind"]])
+
+        # Permanent failures (no template, rejected by Wazzup) are not retried.
+        retry, given_up = [], []
+        for row in failed:
+            permanent = row["error"] in PERMANENT_FAILURES
+            (given_up if permanent or row["attempts"] >= OUTBOX_MAX_ATTEMPTS else retry).append(row)
+        conn.executemany(
+            "UPDATE outbox SET status = 'pending', lease_until = NULL, last_error = ?, next_attempt_at = ? "
+            "WHERE id = ?",
+            [(row["error"], now + min(OUTBOX_RETRY_MAX, OUTBOX_RETRY_BASE * 2 ** (row["attempts"] - 1)), row["id"])
+             for row in retry]
+        )
+        conn.executemany(
+            "UPDATE outbox SET status = 'failed', lease_until = NULL, last_error = ? WHERE id = ?",
+            [(row["error"], row["id"]) for row in given_up]
+        )
+        ledger.release(conn, [(row["reservation_id"], row["ledger_kind"], row["ledger_step"])
+                              for row in given_up if row["ledger_kind"]])
+        reservation_state.mark_dirty(conn, [row["reservation_id"] for row in given_up if row["ledger_kind"]])
+    return given_up
+
+
+def release_orphan_claims() -> int:
+    # Ledger steps claimed by a sweep that died before queueing the message.
+    with local_store.transaction() as conn:
+        cursor = conn.execute(
+            "DELETE FROM reminder_ledger WHERE status = 'pending' AND created_at < ? AND NOT EXISTS ("
+            "SELECT 1 FROM outbox WHERE outbox.reservation_id = reminder_ledger.reservation_id "
+            "AND outbox.ledger_kind = reminder_ledger.kind AND outbox.ledger_step = reminder_ledger.step)",
+            (time.time() - ORPHAN_CLAIM_AGE,)
+        )
+    return cursor.rowcount
+
+
+def prune(before: float) -> int:
+    # Finished entries hold guests' phone numbers; they are not kept forever.
+    with local_store.transaction() as conn:
+        cursor = conn.execute(
+            "DELETE FROM outbox WHERE (status = 'sent' AND sent_at < ?) OR (status = 'failed' AND next_attempt_at < ?)",
+            (before, before)
+        )
+    return cursor.rowcount
+
+
+def next_attempt_at():
+    row = local_store.connect().execute(
+        "SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'"
+    ).fetchone()
+    return row[0]
+
+
+def pending_count() -> int:
+    row = local_store.connect().execute(
+        "SELECT COUNT(*) FROM outbox WHERE status IN ('pending', 'sending')"
+    ).fetchone()
+    return row[0]
+
+
+class OutboxSender:
+    # Drains the outbox in batches; the messages of a batch are sent
+    # concurrently and their results written back together.
+    def __init__(self, batch: int = OUTBOX_BATCH, concurrency: int = OUTBOX_CONCURRENCY,
+                 poll_interval: float = OUTBOX_POLL_INTERVAL):
+        self.batch = batch
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._task = None
+        self._wakeup = asyncio.Event()
+        self._loop = None
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Started outbox sender")
+
+    def notify_threadsafe(self):
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _housekeeping(self):
+        try:
+            released = await asyncio.to_thread(release_orphan_claims)
+            if released:
+                logger.warning(f"Released {released} reminder steps that were never queued")
+        except Exception as e:
+            logger.error(f"Failed to release orphan reminder claims: {e}", exc_info=True)
+
+        try:
+            before = time.time() - OUTBOX_RETENTION
+            pruned = await asyncio.to_thread(prune, before)
+            pruned_jobs = await asyncio.to_thread(delayed_jobs.prune_failed, before)
+            if pruned or pruned_jobs:
+                logger.info(f"Pruned {pruned} finished outbox entries and {pruned_jobs} failed jobs")
+        except Exception as e:
+            logger.error(f"Failed to prune the outbox: {e}", exc_info=True)
+
+    async def _run(self):
+        # Claims are normally given back where they fail; this catches those
+        # of a process that died in between, without waiting for a restart.
+        # The same pass prunes old entries.
+        housekept_at = time.monotonic()
+        await self._housekeeping()
+
+        while True:
+            if time.monotonic() - housekept_at >= HOUSEKEEPING_INTERVAL:
+                housekept_at = time.monotonic()
+                await self._housekeeping()
+
+            try:
+                sent = await self.send_batch()
+            except Exception as e:
+                logger.error(f"Outbox batch failed: {e}", exc_info=True)
+                sent = 0
+
+            if sent:
+                continue
+            self._wakeup.clear()
+            timeout = self.poll_interval
+            try:
+                due = await asyncio.to_thread(next_attempt_at)
+                if due is not None:
+                    timeout = min(timeout, max(0.05, due - time.time()))
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def send_batch(self) -> int:
+        rows = await asyncio.to_thread(claim_due, self.batch)
+        if not rows:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(row: dict) -> str:
+            async with semaphore:
+                with traffic.use(traffic.find(row["recording"])):
+                    return await send_message_async(row["phone"], row["country"], row["step"], row["action"],
+                                                    row["message_key"] or f"outbox-{row['id']}")
+
+        results = await asyncio.gather(*(deliver(row) for row in rows), return_exceptions=True)
+
+        sent, failed = [], []
+        for row, result in zip(rows, results):
+            if result == SENT:
+                sent.append(row)
+                logger.info(f"{row['reservation_id']} - {row['action']} message {row['step']} "
+                            f"to {row['phone']} was just sent.", extra={"reservation_id": row["reservation_id"]})
+            else:
+                # Outcomes are strings; anything else (an exception, or a
+                # CancelledError, which is not one) is stored as its repr.
+                error = result if isinstance(result, str) else repr(result)
+                failed.append(dict(row, error=error))
+
+        given_up = await asyncio.to_thread(record_results, sent, failed)
+        for row in given_up:
+            logger.error(f"{row['reservation_id']} - {row['action']} message {row['step']} failed after "
+                         f"{row['attempts']} attempts: {row['error']}", extra={"reservation_id": row["reservation_id"]})
+            error_notifications(f"{row['reservation_id']} - {row['action']} message {row['step']} could not be "
+                                f"delivered after {row['attempts']} attempts: {row['error']}")
+        if sent:
+            error_notifications(f"Outbox delivered {len(sent)} messages"
+                                + (f", {len(failed)} will be retried" if len(failed) > len(given_up) else ""))
+        return len(rows)
+
+
+sender = OutboxSender()
+
+metrics.Gauge("outbox_pending", "Messages waiting in the outbox.", collect=pending_count)
@@ -1,239 +1,500 @@
 import asyncio
-import requests
-import os
-from dotenv import load_dotenv
-import app.db.nocodb as db
-from datetime import date, timedelta, datetime
-from fastapi import Request
+import time
+import app.db.reminder_ledger as ledger
+from app.db import reservation_cache, reservation_state
+from app.services import clock, delayed_jobs, traffic
+from datetime import timedelta, datetime
 import pytz
 from app.logging_to_file import setup_logger
 from app.services.slack_error_handler import error_notifications
-from app.services.pre_check_in_wazzup import send_message
-from zoneinfo import ZoneInfo
+from app.services import outbox
+from app.services.sweep_summary import SweepSummary
+from app.services.http_client import client as http
+from app.services.listings import directory as listings
+from app.services.reservation import MADRID_TZ, Reservation
+from app.services.templates import store as templates
+from app.settings import settings
 
 logger = setup_logger(__name__)
-load_dotenv()
 
 BAD_STATUSES = {"cancelled", "declined", "expired", "inquiryDenied", "inquiryNotPossible"}
-GET_RESERVATION_BY_ID = "https://api.hostaway.com/v1/reservations"
+HOSTAWAY_API_URL = settings.hostaway_api_url
+GET_RESERVATION_BY_ID = f"{HOSTAWAY_API_URL}/reservations"
+RESERVATIONS_URL = f"{HOSTAWAY_API_URL}/reservations"
+PAGE_LIMIT = settings.hostaway_page_limit
+MAX_CONCURRENT_PAGES = settings.hostaway_max_concurrent_pages
+SWEEP_BATCH_SIZE = settings.sweep_batch_size
+# Gap between two verification reminders to the same guest.
+REMINDER_INTERVAL = settings.reminder_interval
+VERIFICATION_KIND = "checked_verifications"
+RESERVATION_CHECK_DELAY = 15 * 60
+RESERVATION_CACHE_TTL = settings.reservation_cache_ttl
+RESERVATION_FULL_SYNC_INTERVAL = settings.reservation_full_sync_interval
+INCREMENTAL_SYNC_SKEW = 60 * 60
+POST_CHECKIN_DELAY = timedelta(hours=2)
 CHECK_IN_URL = ""
 WEBHOOK_URL = "https://mrhost.top/webhook/34d808dc-03c7-41cd-a426-cae0d7be98f0"
 
-session = requests.Session()
-session.headers.update({
-    'Authorization': f"Bearer {os.getenv('HOSTAWAY_API_KEY')}",
+HOSTAWAY_HEADERS = {
+    'Authorization': f"Bearer {settings.hostaway_api_key}",
     'Cache-control': "no-cache"
-})
+}
 
 
 def get_days(days: int):
-    today = date.today()
+    today = clock.today(MADRID_TZ)
     today_plus_2 = today + timedelta(days=days)
     return today.strftime("%Y-%m-%d"), today_plus_2.strftime("%Y-%m-%d")
 
 
-def get_session_url(action: str) -> str:
+def get_window(action: str) -> tuple:
     start_date, end_date = get_days(1)
     if action == "arrivals":
-        url = (f"https://api.hostaway.com/v1/reservations?offset=0&sortOrder=arrivalDate&arrivalStartDate={start_date}"
-               f"&arrivalEndDate={start_date}")
-    else:
-        url = (f"https://api.hostaway.com/v1/reservations?"
-               f"offset=0&sortOrder=arrivalDate"
-               f"&arrivalStartDate={start_date}&arrivalEndDate={end_date}")
-    return url
+        return start_date, start_date
+    return start_date, end_date
 
 
-def list_reservations(action: str) -> list:
-    valid_reservations = []
-    url = get_session_url(action)
+def get_session_url(action: str, offset: int = 0, window: tuple = None, since: str = None) -> str:
+    start_date, end_date = window or get_window(action)
+    url = (f"{RESERVATIONS_URL}?"
+           f"limit={PAGE_LIMIT}&offset={offset}&sortOrder=arrivalDate"
+           f"&arrivalStartDate={start_date}&arrivalEndDate={end_date}")
+    if since:
+        url += f"&latestActivityStart={since}"
+    return url
+
 
+async def fetch_reservation_page_async(url: str) -> dict:
     try:
         logger.debug(f"Fetching reservations from URL: {url}")
-        error_notifications(f"Fetching reservations from URL: {url}")
-
-        response = session.get(url)
+        response = await http.get("hostaway", url, headers=HOSTAWAY_HEADERS, operation="list_reservations")
         response.raise_for_status()
-
-        json_data = response.json()
-        result = json_data.get("result", [])
-
-        for index, reservation in enumerate(result):
-            status = reservation.get("status")
-            if status not in BAD_STATUSES:
-                valid_reservations.append(reservation)
-
-        return valid_reservations
+        return response.json()
 
     except Exception as e:
         logger.error(f"Failed to fetch reservations from {url}: {e}", exc_info=True)
-        error_notifications(f"Failed to fetch reservations from {url}: {e}")
         raise
 
 
-def check_verifications() -> dict:
-    try:
-        reservations = list_reservations("verifications")
+def to_reservation(data: dict) -> Reservation:
+    # Listing defaults come from the in-memory listing index, never from a
+    # per-reservation request.
+    return Reservation.from_api(data, listings.get(data.get("listingMapId")))
 
-        for reservation in reservations:
 
-            reservation_id = reservation.get("id")
-            phone_number = reservation.get("phone")
-            country = reservation.get("guestCountry")
+def message_language(reservation: Reservation) -> str:
+    # Guests from a country without templates get the property's language
+    # before the global fallback.
+    if reservation.listing_language and reservation.guest_country not in templates.current().languages:
+        return reservation.listing_language
+    return reservation.guest_country
 
-            print(country)
 
-            custom_fields = reservation['customFieldValues']
-            checkin_status = next(
-                (f['value'] for f in custom_fields if f['customField']['name'] == 'Identity Verification Status'),
-                None
-            )
+def valid_reservations(page: dict):
+    for data in page.get("result", []):
+        if data.get("status") in BAD_STATUSES:
+            continue
+        try:
+            yield to_reservation(data)
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"{data.get('id')} - skipping malformed reservation: {e}")
 
-            if checkin_status != "VERIFIED":
-                reminders_num = db.was_reminder_sent(int(reservation_id), "checked_verifications")
-                if reminders_num == 4:
-                    logger.info(f"{reservation_id} - all 3 messages has been already sent.")
-                    error_notifications(f"{reservation_id} - all 3 messages has been already sent.")
-                else:
-                    send_message(phone_number, country, reminders_num, "check-in")
-                    logger.info(f"Reminder message {reminders_num} about verification to {phone_number} was just sent.")
-                    error_notifications(f"Reminder message {reminders_num} about verification to {phone_number} was just sent.")
-            else:
-                logger.info(f"{reservation_id} - VERIFIED")
-                error_notifications(f"{reservation_id} - VERIFIED")
 
-        return {"status_code": 200}
+async def iter_reservation_pages_async(action: str, window: tuple, since: str = None):
+    # The first page tells us the total count; the remaining pages are then
+    # downloaded concurrently while the caller works on the first one.
+    first_url = get_session_url(action, 0, window, since)
+    logger.info(f"Fetching reservations from URL: {first_url}")
+
+    first_page = await fetch_reservation_page_async(first_url)
+    yield first_page
+
+    limit = first_page.get("limit") or PAGE_LIMIT
+    total = first_page.get("count")
+
+    if total is None:
+        # No total in the response: walk sequentially until a short page.
+        page, offset = first_page, 0
+        while len(page.get("result", [])) >= limit:
+            offset += limit
+            page = await fetch_reservation_page_async(get_session_url(action, offset, window, since))
+            yield page
+        return
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_PAGES)
+
+    async def fetch(offset: int) -> dict:
+        async with semaphore:
+            return await fetch_reservation_page_async(get_session_url(action, offset, window, since))
+
+    tasks = [asyncio.create_task(fetch(offset)) for offset in range(limit, int(total), limit)]
+    try:
+        for task in tasks:
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def iter_reservations_async(action: str):
+    # Serve the window from the local cache while its last sync is fresh,
+    # top it up with an incremental (latestActivityStart) listing while the
+    # last full sync is recent enough, and otherwise re-list the whole window.
+    # A recorded sweep always re-lists, so the recording holds every input.
+    window = get_window(action)
+    started_at = time.time()
+    await listings.ensure_fresh()
+    synced_at, full_synced_at = await asyncio.to_thread(reservation_cache.last_sync, *window)
+
+    if (synced_at is None or full_synced_at is None or traffic.recording()
+            or started_at - full_synced_at >= RESERVATION_FULL_SYNC_INTERVAL):
+        listed = set()
+        async for page in iter_reservation_pages_async(action, window):
+            await asyncio.to_thread(reservation_cache.put, page.get("result", []))
+            listed.update(int(r["id"]) for r in page.get("result", []) if r.get("id") is not None)
+            for reservation in valid_reservations(page):
+                yield reservation
+        dropped = await asyncio.to_thread(reservation_cache.finish_full_sync, *window, listed, started_at)
+        if dropped:
+            logger.info(f"Dropped {dropped} cached reservations no longer listed for {window[0]}..{window[1]}")
+        pruned_before = (clock.today(MADRID_TZ) - timedelta(days=7)).strftime("%Y-%m-%d")
+        await asyncio.to_thread(reservation_cache.prune, pruned_before)
+        await asyncio.to_thread(reservation_state.prune, pruned_before)
+        return
+
+    if started_at - synced_at >= RESERVATION_CACHE_TTL:
+        since = datetime.fromtimestamp(synced_at - INCREMENTAL_SYNC_SKEW, tz=pytz.UTC).strftime("%Y-%m-%d")
+        async for page in iter_reservation_pages_async(action, window, since):
+            await asyncio.to_thread(reservation_cache.put, page.get("result", []))
+        await asyncio.to_thread(reservation_cache.mark_synced, *window, started_at, False)
+
+    cached = await asyncio.to_thread(reservation_cache.window, *window)
+    for reservation in valid_reservations({"result": cached}):
+        yield reservation
+
+
+def iter_reservations(action: str):
+    return http.iterate_sync(iter_reservations_async(action))
+
+
+async def get_reservation_async(id: int) -> dict:
+    cached = await asyncio.to_thread(reservation_cache.get, id, RESERVATION_CACHE_TTL)
+    if cached is not None:
+        return {"status": "success", "result": cached}
+
+    response = await http.get(
+        "hostaway", f"{GET_RESERVATION_BY_ID}/{id}", headers=HOSTAWAY_HEADERS, operation="get_reservation"
+    )
+    response.raise_for_status()
+    data = response.json()
+    await asyncio.to_thread(reservation_cache.put, [data.get("result") or {}])
+    return data
+
+
+def list_reservations(action: str) -> list:
+    return list(iter_reservations(action))
+
+
+async def batched_async(iterable, size: int):
+    batch = []
+    async for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def verification_fingerprint(reservation: Reservation) -> str:
+    # What the verification sweep decides on; any change re-evaluates the
+    # reservation.
+    return "|".join(str(value) for value in (
+        reservation.status, reservation.arrival_date, reservation.verification_status,
+        reservation.registration_status,
+    ))
+
+
+def verification_state(reservation: Reservation, outcome: str, step: int, evaluated_at: float,
+                       next_due_at: float = None) -> tuple:
+    return (reservation.id, VERIFICATION_KIND, str(reservation.arrival_date), verification_fingerprint(reservation),
+            reservation.verification_status, reservation.registration_status, step, outcome, evaluated_at,
+            next_due_at)
+
+
+async def check_verifications_async() -> dict:
+    # Messages are only queued here; the outbox sender delivers them and
+    # confirms the claimed reminder step once Wazzup has accepted it.
+    # Reservations whose state is unchanged since the last sweep and whose
+    # next reminder is not due yet are skipped without touching the ledger.
+    summary = SweepSummary("check_verifications")
+    try:
+        async for batch in batched_async(iter_reservations_async("verifications"), SWEEP_BATCH_SIZE):
+            loaded_at = time.time()
+            evaluated_at = clock.now().timestamp()
+            with summary.timed("state"):
+                states = await asyncio.to_thread(reservation_state.load, [r.id for r in batch], VERIFICATION_KIND)
+
+            pending, evaluated = [], []
+            for reservation in batch:
+                reservation_id = reservation.id
+                state = states.get(reservation_id)
+
+                if reservation_state.settled(state, verification_fingerprint(reservation), evaluated_at):
+                    summary.record(reservation_id, "unchanged")
+                elif reservation.verification_status != "VERIFIED":
+                    if state and state["next_due_at"] is not None and state["next_due_at"] > evaluated_at:
+                        # Changed but still unverified: the next reminder keeps its time.
+                        summary.record(reservation_id, "not_due")
+                        evaluated.append(verification_state(
+                            reservation, state["outcome"], state["step"], evaluated_at, state["next_due_at"]
+                        ))
+                    else:
+                        pending.append(reservation)
+                else:
+                    logger.info(f"{reservation_id} - VERIFIED", extra={"reservation_id": reservation_id})
+                    summary.record(reservation_id, "verified")
+                    evaluated.append(verification_state(
+                        reservation, "verified", state["step"] if state else 0, evaluated_at
+                    ))
+
+            messages = []
+            if pending:
+                with summary.timed("ledger"):
+                    reminders = await ledger.were_reminders_sent_async([r.id for r in pending], VERIFICATION_KIND)
+                claimed = [(id, VERIFICATION_KIND, step) for id, step in reminders.items() if step != 4]
+
+                async with ledger.released_on_error(claimed):
+                    for reservation in pending:
+                        reservation_id = reservation.id
+
+                        reminders_num = reminders[reservation_id]
+                        if reminders_num == 4:
+                            logger.info(f"{reservation_id} - all 3 messages has been already sent.", extra={"reservation_id": reservation_id})
+                            summary.record(reservation_id, "max_reminders")
+                            evaluated.append(verification_state(reservation, "max_reminders", ledger.MAX_REMINDERS, evaluated_at))
+                        else:
+                            messages.append(outbox.Message(
+                                reservation_id, reservation.phone, message_language(reservation), "check-in", reminders_num,
+                                VERIFICATION_KIND, reminders_num
+                            ))
+                            summary.record(reservation_id, "queued")
+                            evaluated.append(verification_state(
+                                reservation, "queued", reminders_num, evaluated_at, evaluated_at + REMINDER_INTERVAL
+                            ))
+
+                    with summary.timed("outbox"):
+                        await outbox.add_async(messages)
+            with summary.timed("state"):
+                await asyncio.to_thread(reservation_state.save, evaluated, loaded_at)
+
+        return {"status_code": 200, "summary": summary.as_dict()}
 
     except Exception as e:
         logger.warning(f"Request failed: {e}")
-        error_notifications(f"Request failed: {e}")
-        return {"status_code": 201}
+        summary.fail(f"Request failed: {e}")
+        return {"status_code": 201, "summary": summary.as_dict()}
+
+
+def check_verifications() -> dict:
+    return http.run_sync(check_verifications_async())
 
 
 async def webhook(data: dict):
     id = data.get('id')
     arrival_date = data.get('arrivalDate')
 
+    if id is not None:
+        await asyncio.to_thread(reservation_cache.put, [data])
+        # The next sweep re-evaluates it whatever its fingerprint says.
+        await asyncio.to_thread(reservation_state.invalidate, [id])
+
     if not arrival_date:
         error_notifications(f"No arrival date for {id}")
         return {"error": "checkin_date missing"}
 
+    await listings.ensure_fresh()
     try:
-        naive_date = datetime.strptime(arrival_date, "%Y-%m-%d")
-        checkin_date = pytz.UTC.localize(naive_date)
+        reservation = to_reservation(data)
+        checkin_date = datetime.combine(reservation.arrival_date, datetime.min.time(), tzinfo=pytz.UTC)
     except Exception as e:
         error_notifications(f"Invalid arrival date format for {id}: {arrival_date}")
         return {"error": f"Invalid date format: {str(e)}"}
 
+    today = clock.today(MADRID_TZ)
+    if today <= reservation.arrival_date <= today + timedelta(days=1) or reservation.status in BAD_STATUSES:
+        await plan_post_checkin(reservation)
+
     now = datetime.now(tz=pytz.UTC)
 
     if checkin_date <= now + timedelta(days=1):
-        logger.info(f"Started processing {id} the reservation.")
+        logger.info(f"Started processing {id} the reservation.", extra={"reservation_id": id})
         error_notifications(f"Started processing {id} the reservation.")
-        await process_reservation_with_delay(id)
+        job_id = await asyncio.to_thread(
+            delayed_jobs.enqueue, "reservation_check", {"id": reservation.id}, RESERVATION_CHECK_DELAY
+        )
+        return {"status": "scheduled", "job_id": job_id}
     else:
         error_notifications(f"More than one day for registration {id}")
         logger.info(f"More than one day for registration {id}")
 
 
-def arrivals():
+async def plan_post_checkin(reservation: Reservation) -> str:
+    # One keyed job per reservation, due exactly two hours after check-in.
+    # Planning again (e.g. from a webhook) moves the existing job.
+    key = f"post_checkin:{reservation.id}"
+    if reservation.status in BAD_STATUSES or reservation.checkin_at is None:
+        await asyncio.to_thread(delayed_jobs.cancel, key)
+        return "cancelled"
+
+    deadline = reservation.checkin_at + POST_CHECKIN_DELAY
+    await asyncio.to_thread(delayed_jobs.schedule, "post_checkin", key, {"id": reservation.id}, deadline.timestamp())
+    return "scheduled"
+
+
+@delayed_jobs.job("post_checkin")
+async def post_checkin_job(id: int):
+    data = await get_reservation_async(id)
+    await listings.ensure_fresh()
+    reservation = to_reservation(data['result'])
+
+    if reservation.status in BAD_STATUSES or reservation.checkin_at is None:
+        logger.info(f"{id} - post-checkin message no longer needed.", extra={"reservation_id": id})
+        return
+
+    now = datetime.now(MADRID_TZ)
+    deadline = reservation.checkin_at + POST_CHECKIN_DELAY
+    if now < deadline:
+        raise delayed_jobs.Reschedule(deadline.timestamp())
+    if reservation.arrival_date < now.date():
+        logger.info(f"{id} - arrival date {reservation.arrival_date} has passed, post-checkin message skipped.", extra={"reservation_id": id})
+        return
+
+    codes = await ledger.arrival_messages_async([reservation.id], "post_checkin")
+    if codes[reservation.id] == 200:
+        async with ledger.released_on_error([(reservation.id, "post_checkin", 1)]):
+            await outbox.add_async([post_checkin_message(reservation)])
+    else:
+        logger.info(f"{id} - arrival message has been already sent.", extra={"reservation_id": id})
+
+
+def post_checkin_message(reservation: Reservation) -> outbox.Message:
+    return outbox.Message(
+        reservation.id, reservation.phone, message_language(reservation), "post-check-in", 0, "post_checkin", 1
+    )
+
+
+async def arrivals_async() -> dict:
+    summary = SweepSummary("arrivals")
     try:
-        reservations = list_reservations("arrivals")
+        async for batch in batched_async(iter_reservations_async("arrivals"), SWEEP_BATCH_SIZE):
+            due = []
 
-        for reservation in reservations:
+            now = clock.now(MADRID_TZ)
 
-            reservation_id = reservation.get("id")
-            phone_number = reservation.get("phone")
-            country = reservation.get("guestCountry")
-            arrival_hour = reservation.get("checkInTime")  # e.g., 15
-            reservation_date_str = reservation.get("arrivalDate")  # e.g., "2024-07-20"
+            for reservation in batch:
+                reservation_id = reservation.id
 
-            # Validation
-            if arrival_hour is None or reservation_date_str is None:
-                logger.warning(f"{reservation_id} - Missing check-in time or reservation date")
-                continue
+                # Validation
+                if reservation.checkin_at is None:
+                    logger.warning(f"{reservation_id} - Missing check-in time or reservation date", extra={"reservation_id": reservation_id})
+                    summary.record(reservation_id, "invalid")
+                    continue
+                if reservation.arrival_date < now.date():
+                    # Same rule as post_checkin_job: a past arrival gets no message.
+                    logger.info(f"{reservation_id} - arrival date {reservation.arrival_date} has passed, post-checkin message skipped.", extra={"reservation_id": reservation_id})
+                    summary.record(reservation_id, "past_arrival")
+                    continue
+
+                # Add 2 hours to check-in time
+                deadline = reservation.checkin_at + POST_CHECKIN_DELAY
 
-            # Parse the reservation date string to datetime
-            reservation_date = datetime.strptime(reservation_date_str, "%Y-%m-%d")
+                logger.debug("Now: %s, check-in: %s, deadline (check-in + 2h): %s",
+                             now, reservation.checkin_at, deadline, extra={"reservation_id": reservation_id})
 
-            # Build full datetime for check-in
-            checkin_datetime = reservation_date.replace(hour=arrival_hour, minute=0, second=0)
+                if now >= deadline:
+                    due.append(reservation)
+                else:
+                    logger.info(f"{reservation_id} - less than 2 hours after the official arrival time, "
+                                f"post-checkin message planned for {deadline}", extra={"reservation_id": reservation_id})
+                    with summary.timed("plan"):
+                        summary.record(reservation_id, await plan_post_checkin(reservation))
 
-            checkin_datetime = checkin_datetime.replace(tzinfo=ZoneInfo("Europe/Madrid"))
+            if not due:
+                continue
 
-            # Add 2 hours to check-in time
-            deadline = checkin_datetime + timedelta(hours=2)
+            with summary.timed("ledger"):
+                try:
+                    codes = await ledger.arrival_messages_async([r.id for r in due], "post_checkin")
+                except Exception as e:
+                    # Nothing was claimed; the batch is reported and the sweep goes on.
+                    logger.error(f"Failed to claim arrival messages: {e}", exc_info=True)
+                    codes = dict.fromkeys((r.id for r in due), 500)
+            claimed = [(id, "post_checkin", 1) for id, code in codes.items() if code == 200]
+            messages = []
 
-            now = datetime.now(ZoneInfo("Europe/Madrid"))
+            async with ledger.released_on_error(claimed):
+                for reservation in due:
+                    reservation_id = reservation.id
 
-            print(f"[DEBUG] Reservation ID: {reservation_id}")
-            print(f"[DEBUG] Now: {now}")
-            print(f"[DEBUG] Check-in datetime: {checkin_datetime}")
-            print(f"[DEBUG] Deadline (check-in + 2h): {deadline}")
+                    code = codes[reservation_id]
+                    if code == 200:
+                        messages.append(post_checkin_message(reservation))
+                        summary.record(reservation_id, "queued")
 
-            if now >= deadline:
-                code = db.arrival_message(int(reservation_id), "post_checkin")
-                if code == 200:
-                    send_message(phone_number, country, 0, "post-check-in")
-                    logger.info(f"{reservation_id} - post-checkin message was just sent.")
-                    error_notifications(f"{reservation_id} - post-checkin message was just sent")
+                    elif code == 300:
+                        logger.info(f"{reservation_id} - arrival message has been already sent.", extra={"reservation_id": reservation_id})
+                        summary.record(reservation_id, "already_sent")
 
-                elif code == 300:
-                    logger.info(f"{reservation_id} - arrival message has been already sent.")
-                    error_notifications(f"{reservation_id} - arrival message has been already sent.")
+                    else:
+                        logger.error(f"{reservation_id} - Failed to insert value in db. Message not send", extra={"reservation_id": reservation_id})
+                        summary.record(reservation_id, "db_failed", "Failed to insert value in db. Message not send")
 
-                else:
-                    logger.error(f"{reservation_id} - Failed to insert value in db. Message not send")
-                    error_notifications(f"{reservation_id} - Failed to insert value in db. Message not send")
-            else:
-                logger.info(f"{reservation_id} - less than 2 hours after the official arrival time")
-                error_notifications(f"{reservation_id} - less than 2 hours after the official arrival time")
+                with summary.timed("outbox"):
+                    await outbox.add_async(messages)
 
-        return {"status_code": 200}
+        return {"status_code": 200, "summary": summary.as_dict()}
 
     except Exception as e:
         logger.warning(f"Request failed: {e}")
-        error_notifications(f"Request failed: {e}")
-        return {"status_code": 201}
+        summary.fail(f"Request failed: {e}")
+        return {"status_code": 201, "summary": summary.as_dict()}
 
 
-async def process_reservation_with_delay(id: int):
-    try:
-        await asyncio.sleep(15 * 60)
-        data = session.get(f"{GET_RESERVATION_BY_ID}/{id}").json()
-
-        custom_fields = data['result']['customFieldValues']
-        phone_number = data['result']['phone']
-        country = data['result']['guestCountry']
+def arrivals():
+    return http.run_sync(arrivals_async())
 
-        register_check = next(
-            (f['value'] for f in custom_fields if f['customField']['name'] == 'Check-in Online Status'), None)
-        verification_check = next(
-            (f['value'] for f in custom_fields if f['customField']['name'] == 'Identity Verification Status'), None)
 
-        if not register_check and not verification_check:
-            send_message("+380991570383", "docs_reg", country)
-            logger.info(f"Reminder message about verification and registration to {phone_number} was just sent.")
-            error_notifications(f"Reminder message about verification and registration to {phone_number} was just sent.")
+@delayed_jobs.job("reservation_check")
+async def process_reservation(id: int):
+    data = await get_reservation_async(id)
+    await listings.ensure_fresh()
+    reservation = to_reservation(data['result'])
 
-        elif not register_check:
-            send_message("+380991570383", "reg", country)
-            logger.info(f"Reminder message about registration to {phone_number} was just sent.")
-            error_notifications(f"Reminder message about registration to {phone_number} was just sent.")
+    phone_number = reservation.phone
+    country = message_language(reservation)
 
-        elif not verification_check:
-            send_message("+380991570383", "docs", country)
-            logger.info(f"Reminder message about verification to {phone_number} was just sent.")
-            error_notifications(f"Reminder message about verification to {phone_number} was just sent.")
+    register_check = reservation.registration_status
+    verification_check = reservation.verification_status
 
-        else:
-            error_notifications(f"User have registered and verified in 15 mins")
-            logger.info(f"User have registered and verified in 15 mins")
+    if not register_check and not verification_check:
+        action, about = "docs_reg", "verification and registration"
+    elif not register_check:
+        action, about = "reg", "registration"
+    elif not verification_check:
+        action, about = "docs", "verification"
+    else:
+        error_notifications(f"User have registered and verified in 15 mins")
+        logger.info(f"User have registered and verified in 15 mins")
+        return {"status_code": 200}
 
+    if not templates.current().has_action(action):
+        logger.warning(f"{id} - no templates for {action}, reminder about {about} not sent",
+                       extra={"reservation_id": id})
         return {"status_code": 200}
 
-    except Exception as e:
-        logger.error(f"Failed to process reservation: {e}", exc_info=True)
-        error_notifications(f"Failed to process reservation: {e}")
-        return {"status_code": 201}
+    await outbox.add_async([outbox.Message(id, phone_number, country, action, 0)])
+    logger.info(f"Reminder message about {about} to {phone_number} was queued.", extra={"reservation_id": id})
+    error_notifications(f"Reminder message about {about} to {phone_number} was queued.")
 
+    return {"status_code": 200}
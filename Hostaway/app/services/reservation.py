@@ -0,0 +1,67 @@
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+MADRID_TZ = ZoneInfo("Europe/Madrid")
+
+VERIFICATION_FIELD = 'Identity Verification Status'
+REGISTRATION_FIELD = 'Check-in Online Status'
+
+
+@dataclass(slots=True, frozen=True)
+class Reservation:
+    id: int
+    status: str
+    phone: str
+    guest_country: str
+    arrival_date: date
+    check_in_hour: int
+    checkin_at: datetime  # arrival date + check-in hour, in the listing's time zone
+    custom_fields: dict
+    raw: dict = field(repr=False, compare=False)
+    listing_language: str = None
+
+    @classmethod
+    def from_api(cls, data: dict, listing=None) -> "Reservation":
+        # `listing` (a listings.Listing) supplies the property defaults for
+        # what the reservation leaves out.
+        arrival_date_str = data.get("arrivalDate")
+        arrival_date = date.fromisoformat(arrival_date_str) if arrival_date_str else None
+
+        check_in_hour = data.get("checkInTime")
+        check_in_hour = int(check_in_hour) if check_in_hour is not None else None
+        if check_in_hour is None and listing is not None:
+            check_in_hour = listing.check_in_hour
+        timezone = listing.timezone if listing is not None and listing.timezone else MADRID_TZ
+
+        checkin_at = None
+        if arrival_date is not None and check_in_hour is not None:
+            checkin_at = datetime(arrival_date.year, arrival_date.month, arrival_date.day,
+                                  check_in_hour, tzinfo=timezone)
+
+        custom_fields = {
+            f['customField']['name']: f['value']
+            for f in data.get("customFieldValues") or []
+            if f.get('customField')
+        }
+
+        return cls(
+            id=int(data["id"]),
+            status=data.get("status"),
+            phone=data.get("phone"),
+            guest_country=data.get("guestCountry"),
+            arrival_date=arrival_date,
+            check_in_hour=check_in_hour,
+            checkin_at=checkin_at,
+            custom_fields=custom_fields,
+            listing_language=listing.language if listing is not None else None,
+            raw=data,
+        )
+
+    @property
+    def verification_status(self):
+        return self.custom_fields.get(VERIFICATION_FIELD)
+
+    @property
+    def registration_status(self):
+        return self.custom_fields.get(REGISTRATION_FIELD)
@@ -0,0 +1,155 @@
+import asyncio
+from uuid import uuid4
+from pytz import timezone
+from app.db import locks, sweep_history
+from app.services import metrics, outbox, traffic
+from app.services.sweep_summary import digest
+from app.logging_to_file import setup_logger
+from app.services.slack_error_handler import error_notifications
+from app.services.pre_check_in_guest_filtering import arrivals_async, check_verifications_async
+from app.settings import settings
+
+logger = setup_logger(__name__)
+
+SCHEDULER_ENABLED = settings.scheduler_enabled
+SCHEDULER_HOURS = settings.scheduler_hours
+ARRIVALS_PLAN_HOURS = settings.arrivals_plan_hours
+SCHEDULER_JITTER = settings.scheduler_jitter
+SCHEDULER_MISFIRE_GRACE = settings.scheduler_misfire_grace
+SWEEP_LOCK_TTL = settings.sweep_lock_ttl
+SCHEDULER_LEADER_TTL = settings.scheduler_leader_ttl
+
+spain_tz = timezone('Europe/Madrid')
+
+SWEEPS = {
+    "check_verifications": check_verifications_async,
+    "arrivals": arrivals_async,
+}
+
+
+async def run_sweep(name: str) -> dict:
+    # The lease lock keeps a second replica (or a manual trigger racing the
+    # cron) from running the same sweep on top of this one.
+    # Each run holds the lease under its own owner: renewal by the same owner
+    # is meant for the scheduler lease, and would let two runs in one
+    # process share it.
+    lock_name = f"sweep:{name}"
+    lock_owner = f"{locks.OWNER}:{uuid4()}"
+    if not await asyncio.to_thread(locks.acquire, lock_name, SWEEP_LOCK_TTL, lock_owner):
+        await asyncio.to_thread(sweep_history.start, name, locks.OWNER, "skipped")
+        metrics.SWEEP_RUNS.inc(sweep=name, status="skipped")
+        logger.info(f"Sweep {name} is already running elsewhere, skipped.", extra={"sweep": name})
+        return {"status_code": 409}
+
+    run_id = await asyncio.to_thread(sweep_history.start, name, locks.OWNER)
+    recorder = await asyncio.to_thread(traffic.start_recording, name)
+    try:
+        with metrics.SWEEP_SECONDS.time(sweep=name), traffic.use(recorder):
+            result = await SWEEPS[name]()
+        status = "success" if result["status_code"] == 200 else "failed"
+        metrics.SWEEP_RUNS.inc(sweep=name, status=status)
+        summary = result.get("summary", {})
+        await asyncio.to_thread(sweep_history.finish, run_id, status, summary=summary)
+
+        # One digest per run instead of a Slack line per reservation.
+        message = digest(summary, status)
+        logger.info(message, extra={"sweep": name})
+        error_notifications(message)
+        return {**result, "run_id": run_id}
+
+    except Exception as e:
+        metrics.SWEEP_RUNS.inc(sweep=name, status="error")
+        await asyncio.to_thread(sweep_history.finish, run_id, "error", str(e))
+        logger.error(f"Sweep {name} failed: {e}", exc_info=True, extra={"sweep": name})
+        error_notifications(f"Sweep {name} failed: {e}")
+        raise
+
+    finally:
+        await asyncio.to_thread(locks.release, lock_name, lock_owner)
+        if recorder is not None:
+            traffic.stop_recording_later(recorder, outbox.pending_count)
+
+
+def create_scheduler() -> "AsyncIOScheduler":
+    # Only the scheduler leader needs APScheduler.
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+    scheduler = AsyncIOScheduler(
+        timezone=spain_tz,
+        job_defaults={
+            "max_instances": 1,
+            "coalesce": True,
+            "misfire_grace_time": SCHEDULER_MISFIRE_GRACE,
+        },
+    )
+
+    scheduler.add_job(
+        run_sweep,
+        'cron',
+        args=["check_verifications"],
+        hour=SCHEDULER_HOURS,
+        jitter=SCHEDULER_JITTER,
+        id="check_verifications",
+        replace_existing=True
+    )
+    logger.info("Scheduled job: check_verifications")
+
+    scheduler.add_job(
+        run_sweep,
+        'cron',
+        args=["arrivals"],
+        hour=ARRIVALS_PLAN_HOURS,
+        minute=1,
+        jitter=SCHEDULER_JITTER,
+        id="arrivals",
+        replace_existing=True
+    )
+    logger.info("Scheduled job: arrivals")
+
+    return scheduler
+
+
+class SchedulerLeader:
+    # With several web workers (or replicas) only the holder of the
+    # "scheduler" lease runs the cron triggers. The lease is renewed every
+    # third of its TTL; if the leader dies, another process takes over once
+    # it expires.
+    LOCK = "scheduler"
+
+    def __init__(self, ttl: int = SCHEDULER_LEADER_TTL):
+        self.ttl = ttl
+        self.scheduler = None
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.scheduler is not None:
+            self.scheduler.shutdown(wait=False)
+            self.scheduler = None
+            await asyncio.to_thread(locks.release, self.LOCK)
+
+    async def _run(self):
+        while True:
+            try:
+                leader = await asyncio.to_thread(locks.acquire, self.LOCK, self.ttl)
+            except Exception as e:
+                logger.error(f"Scheduler lease check failed: {e}", exc_info=True)
+                leader = False
+
+            if leader and self.scheduler is None:
+                logger.info(f"{locks.OWNER} is now running the scheduler")
+                self.scheduler = create_scheduler()
+                self.scheduler.start()
+            elif not leader and self.scheduler is not None:
+                logger.warning(f"{locks.OWNER} lost the scheduler lease, stopping its scheduler")
+                self.scheduler.shutdown(wait=False)
+                self.scheduler = None
+
+            await asyncio.sleep(self.ttl / 3)
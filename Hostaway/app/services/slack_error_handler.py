@@ -1,20 +1,133 @@
-import os
-import requests
+import queue
+import threading
+import time
 from app.logging_to_file import setup_logger
-from dotenv import load_dotenv
+from app.services.http_client import HttpError, client as http
+from app.services.resilience import CircuitOpenError
+from app.settings import settings
 
 logger = setup_logger(__name__)
-load_dotenv()
 
-SLACK_API = os.getenv('SLACK_API')
+SLACK_API = settings.slack_api
+SLACK_BATCH_LINES = settings.slack_batch_lines
+SLACK_BATCH_INTERVAL_MS = settings.slack_batch_interval_ms
+SLACK_QUEUE_SIZE = settings.slack_queue_size
+SLACK_MAX_RETRIES = 5
+
+
+class SlackNotifier:
+    def __init__(self, url: str, batch_lines: int, interval_ms: int, queue_size: int):
+        self.url = url
+        self.batch_lines = batch_lines
+        self.interval = interval_ms / 1000
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._dropped = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="slack-notifier", daemon=True)
+                self._thread.start()
+
+    def notify(self, message) -> bool:
+        self.start()
+        try:
+            self._queue.put_nowait(str(message))
+            return True
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+            return False
+
+    def flush(self, timeout: float = 10) -> bool:
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def shutdown(self, timeout: float = 10):
+        self.flush(timeout)
+        if self._thread is not None and self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                return
+            self._thread.join(timeout)
+
+    def _run(self):
+        lines = []
+        deadline = None
+
+        while True:
+            wait = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=wait)
+            except queue.Empty:
+                item = ""
+
+            if isinstance(item, str) and item:
+                lines.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.interval
+                if len(lines) < self.batch_lines:
+                    continue
+
+            elif isinstance(item, str) and deadline is not None and time.monotonic() < deadline:
+                continue
+
+            self._post(lines)
+            lines, deadline = [], None
+
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                return
+
+    def _post(self, lines: list):
+        with self._lock:
+            dropped, self._dropped = self._dropped, 0
+        if dropped:
+            lines = lines + [f"... {dropped} notifications dropped (queue full)"]
+        if not lines or not self.url:
+            return
+
+        payload = {"text": "\n".join(lines)}
+        delay = 1.0
+
+        # Pacing and Retry-After are handled by the client's rate limiter for
+        # the slack provider; an open circuit drops the batch straight away.
+        for attempt in range(SLACK_MAX_RETRIES):
+            try:
+                response = http.post_sync("slack", self.url, json=payload, operation="post_message")
+
+                if response.status_code == 429:
+                    continue
+                elif response.status_code < 500:
+                    response.raise_for_status()
+                    return
+            except HttpError as e:
+                logger.error(e)
+                return
+            except CircuitOpenError as e:
+                logger.error(f"Dropped Slack batch of {len(lines)} lines: {e}")
+                return
+            except Exception as e:
+                logger.error(e)
+
+            time.sleep(delay)
+            delay = min(delay * 2, 60)
+
+        logger.error(f"Dropped Slack batch of {len(lines)} lines after {SLACK_MAX_RETRIES} attempts")
+
+
+notifier = SlackNotifier(SLACK_API, SLACK_BATCH_LINES, SLACK_BATCH_INTERVAL_MS, SLACK_QUEUE_SIZE)
 
 
 def error_notifications(error_message):
-    try:
-        payload = {"text": error_message}
-        response = requests.post(SLACK_API, json=payload)
-        response.raise_for_status()
-        return True
-    except Exception as e:
-        logger.error(e)
-        return False
\ No newline at end of file
+    return notifier.notify(error_message)
@@ -0,0 +1,65 @@
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+DIGEST_MAX_FAILURES = 10
+
+
+@dataclass
+class SweepSummary:
+    # Everything a sweep decided, built up in memory while it runs. It is
+    # returned by the route, stored with the run and posted as one digest.
+    sweep: str
+    outcomes: dict = field(default_factory=dict)
+    failures: list = field(default_factory=list)
+    timings: dict = field(default_factory=lambda: defaultdict(float))
+    started_at: float = field(default_factory=time.time)
+
+    def record(self, reservation_id, outcome: str, error: str = None) -> None:
+        self.outcomes[reservation_id] = outcome
+        if error:
+            self.failures.append({"reservation_id": reservation_id, "error": error})
+
+    def fail(self, error: str) -> None:
+        # A failure of the sweep itself rather than of one reservation.
+        self.failures.append({"reservation_id": None, "error": error})
+
+    @contextmanager
+    def timed(self, phase: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[phase] += time.perf_counter() - started
+
+    def as_dict(self) -> dict:
+        ids = defaultdict(list)
+        for reservation_id, outcome in self.outcomes.items():
+            ids[outcome].append(reservation_id)
+        return {
+            "sweep": self.sweep,
+            "started_at": self.started_at,
+            "duration_s": round(time.time() - self.started_at, 3),
+            "total": len(self.outcomes),
+            "counts": dict(Counter(self.outcomes.values())),
+            "ids": dict(ids),
+            "failures": self.failures,
+            "timings": {phase: round(seconds, 3) for phase, seconds in self.timings.items()},
+            "reservations": self.outcomes,
+        }
+
+
+def digest(summary: dict, status: str) -> str:
+    # One Slack message per sweep run.
+    counts = ", ".join(f"{outcome} {count}" for outcome, count in sorted(summary.get("counts", {}).items()))
+    lines = [f"Sweep {summary.get('sweep')} {status} in {summary.get('duration_s', 0):.1f}s: "
+             f"{summary.get('total', 0)} reservations" + (f" ({counts})" if counts else "")]
+
+    failures = summary.get("failures", [])
+    for failure in failures[:DIGEST_MAX_FAILURES]:
+        prefix = f"{failure['reservation_id']} - " if failure["reservation_id"] is not None else ""
+        lines.append(f"  {prefix}{failure['error']}")
+    if len(failures) > DIGEST_MAX_FAILURES:
+        lines.append(f"  ... and {len(failures) - DIGEST_MAX_FAILURES} more failures")
+    return "\n".join(lines)
@@ -0,0 +1,157 @@
+import argparse
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+import yaml
+from app.logging_to_file import setup_logger
+from app.settings import settings
+
+logger = setup_logger(__name__)
+
+TEMPLATES_PATH = settings.templates_path
+TEMPLATES_RELOAD_INTERVAL = settings.templates_reload_interval
+
+
+@dataclass(frozen=True)
+class TemplateIndex:
+    version: int
+    channel_id: str
+    crm_user_id: str
+    chat_type: str
+    fallback_language: str
+    languages: tuple
+    steps: MappingProxyType
+    templates: MappingProxyType  # (action, step, language) -> template id
+    explicit: frozenset  # keys present in the file, before fallback filling
+
+    def resolve(self, action: str, step: int, language: str):
+        template_id = self.templates.get((action, step, language))
+        if template_id is None:
+            template_id = self.templates.get((action, step, self.fallback_language))
+        return template_id
+
+    def has_action(self, action: str) -> bool:
+        return any(key[0] == action for key in self.explicit)
+
+    def missing(self) -> list:
+        problems = []
+        for action, steps in self.steps.items():
+            for step in steps:
+                for language in self.languages:
+                    if (action, step, language) not in self.explicit:
+                        problems.append((action, step, language))
+        return problems
+
+
+def build_index(config: dict) -> TemplateIndex:
+    fallback = config.get("fallback_language", "EN")
+    languages = tuple(str(language) for language in config.get("languages", [fallback]))
+
+    explicit = {}
+    for action, steps in (config.get("templates") or {}).items():
+        for step, by_language in (steps or {}).items():
+            for language, template_id in (by_language or {}).items():
+                if not isinstance(language, str):
+                    # YAML 1.1 reads unquoted NO / ON / YES as booleans.
+                    raise ValueError(f"Language key {language!r} under {action}/{step} must be quoted")
+                explicit[(str(action), int(step), language)] = str(template_id)
+
+    # Resolve the fallback once here instead of on every send.
+    templates = dict(explicit)
+    for (action, step, language), template_id in explicit.items():
+        if language != fallback:
+            continue
+        for other in languages:
+            templates.setdefault((action, step, other), template_id)
+
+    steps = config.get("steps") or {}
+    if not steps:
+        for action, step, _ in explicit:
+            steps.setdefault(action, set()).add(step)
+
+    return TemplateIndex(
+        version=int(config.get("version", 0)),
+        channel_id=str(config["channel_id"]),
+        crm_user_id=str(config["crm_user_id"]),
+        chat_type=str(config.get("chat_type", "whatsapp")),
+        fallback_language=fallback,
+        languages=languages,
+        steps=MappingProxyType({str(action): tuple(sorted(s)) for action, s in steps.items()}),
+        templates=MappingProxyType(templates),
+        explicit=frozenset(explicit),
+    )
+
+
+def load_index(path: str = TEMPLATES_PATH) -> TemplateIndex:
+    with open(path, encoding="utf-8") as f:
+        return build_index(yaml.safe_load(f))
+
+
+class TemplateStore:
+    # Holds the current index and swaps in a new one when the file changes.
+    # A broken file is logged and the previous index stays in use.
+    def __init__(self, path: str = TEMPLATES_PATH, reload_interval: float = TEMPLATES_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._index = None
+        self._mtime = None
+        self._checked = 0.0
+
+    def current(self) -> TemplateIndex:
+        now = time.monotonic()
+        if self._index is None or now - self._checked >= self.reload_interval:
+            self._maybe_reload(now)
+        return self._index
+
+    def _maybe_reload(self, now: float) -> None:
+        with self._lock:
+            self._checked = now
+            try:
+                mtime = os.stat(self.path).st_mtime
+                if self._index is not None and mtime == self._mtime:
+                    return
+                index = load_index(self.path)
+            except Exception as e:
+                if self._index is None:
+                    raise
+                logger.error(f"Failed to reload templates from {self.path}: {e}")
+                return
+
+            if self._index is not None:
+                logger.info(f"Reloaded templates v{index.version} from {self.path}")
+            self._index, self._mtime = index, mtime
+
+
+store = TemplateStore()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Validate the Wazzup template config.")
+    parser.add_argument("--path", default=TEMPLATES_PATH)
+    args = parser.parse_args(argv)
+
+    try:
+        index = load_index(args.path)
+    except Exception as e:
+        print(f"Invalid template config {args.path}: {e}")
+        return 2
+
+    missing = index.missing()
+    print(f"Templates v{index.version}: {len(index.explicit)} defined, "
+          f"{len(index.languages)} languages, fallback {index.fallback_language}")
+
+    for action, step, language in missing:
+        if index.resolve(action, step, language):
+            print(f"  {action} step {step} {language}: missing, falls back to {index.fallback_language}")
+        else:
+            print(f"  {action} step {step} {language}: missing, no fallback")
+
+    return 1 if missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+from app.db import local_store
+from app.logging_to_file import setup_logger
+from app.settings import settings
+
+logger = setup_logger(__name__)
+
+# Record / replay of outbound traffic.
+#
+# With TRAFFIC_RECORD_DIR set, every sweep writes the raw Hostaway, NocoDB
+# and Wazzup responses it causes to <dir>/<sweep>-<timestamp>.jsonl.gz,
+# together with a snapshot of the local state its decisions depend on.
+# `python -m app.script.replay` runs the sweep again from such a file with
+# nothing going out, and writes a per-reservation decision report.
+
+TRAFFIC_RECORD_DIR = settings.traffic_record_dir
+TRAFFIC_RECORD_DRAIN = settings.traffic_record_drain
+
+# Local tables whose rows change what a sweep decides.
+STATE_TABLES = ("reminder_ledger", "reminder_seeds", "reservation_state", "listings", "listing_pages")
+RESPONSE_HEADERS = ("Content-Type", "ETag", "Retry-After")
+UNRECORDED = {"slack"}
+# Body fields that differ on every run and must not change a request's key.
+VOLATILE_FIELDS = ("crmMessageId",)
+
+# Each request is written only to the recording of the sweep that made it:
+# the sweep runs with its recorder in `_current`, and outbox entries carry
+# the recorder's name so their deliveries land in the same file.
+_current = ContextVar("traffic_recorder", default=None)
+_recorders = {}
+_stopping = set()
+
+
+class ReplayMiss(Exception):
+    pass
+
+
+def request_key(provider: str, method: str, url: str, params=None, json_body=None) -> str:
+    # The host is left out, so a recording replays against any base URL.
+    parts = urlsplit(url)
+    target = parts.path + (f"?{parts.query}" if parts.query else "")
+    if params:
+        target += ("&" if "?" in target else "?") + urlencode(params)
+    key = f"{provider} {method} {target}"
+    if json_body is not None:
+        if isinstance(json_body, dict):
+            json_body = {k: v for k, v in json_body.items() if k not in VOLATILE_FIELDS}
+        key += " " + hashlib.sha1(json.dumps(json_body, sort_keys=True).encode()).hexdigest()[:16]
+    return key
+
+
+class Recorder:
+    # Entries are queued and written by a thread of the recorder's own, off
+    # the HTTP client loop that produces them.
+    def __init__(self, path: str, sweep: str):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.sweep = sweep
+        self.count = 0
+        self._queue = queue.SimpleQueue()
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self._writer = threading.Thread(target=self._drain, name=f"traffic-{self.name}", daemon=True)
+        self._writer.start()
+        self._write({
+            "type": "meta",
+            "sweep": sweep,
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+        })
+        self._write_state()
+
+    def _drain(self) -> None:
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                break
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.close()
+
+    def _write(self, entry: dict) -> None:
+        self._queue.put(entry)
+
+    def _write_state(self) -> None:
+        conn = local_store.connect()
+        for table in STATE_TABLES:
+            rows = [dict(row) for row in conn.execute(f"SELECT * FROM {table}")]
+            self._write({"type": "state", "table": table, "rows": rows})
+
+    def record(self, provider: str, method: str, url: str, operation: str, kwargs: dict, elapsed: float,
+               status: int = None, content: bytes = b"", headers=None, error: Exception = None) -> None:
+        entry = {
+            "type": "http",
+            "key": request_key(provider, method, url, kwargs.get("params"), kwargs.get("json")),
+            "provider": provider,
+            "operation": operation,
+            "elapsed": round(elapsed, 4),
+        }
+        if error is not None:
+            entry["error"] = f"{type(error).__name__}: {error}"
+        else:
+            entry["status"] = status
+            entry["headers"] = {name: headers[name] for name in RESPONSE_HEADERS if name in headers}
+            entry["content"] = content.decode("utf-8", errors="replace")
+        self._write(entry)
+        self.count += 1
+
+    def close(self) -> None:
+        # Waits for the queued entries, so the gzip trailer is always written.
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+
+
+def current():
+    return _current.get()
+
+
+def recording() -> bool:
+    return _current.get() is not None
+
+
+@contextmanager
+def use(recorder):
+    token = _current.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current.reset(token)
+
+
+def find(name: str):
+    return _recorders.get(name) if name else None
+
+
+def record(*args, **kwargs) -> None:
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.record(*args, **kwargs)
+
+
+def start_recording(sweep: str):
+    if not TRAFFIC_RECORD_DIR:
+        return None
+    os.makedirs(TRAFFIC_RECORD_DIR, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    recorder = Recorder(os.path.join(TRAFFIC_RECORD_DIR, f"{sweep}-{stamp}.jsonl.gz"), sweep)
+    _recorders[recorder.name] = recorder
+    return recorder
+
+
+async def stop_recording(recorder: Recorder, pending=None) -> None:
+    # Messages a sweep queues are delivered afterwards by the outbox; the
+    # recording stays open until they are out, or for TRAFFIC_RECORD_DRAIN.
+    try:
+        if pending is not None:
+            deadline = time.monotonic() + TRAFFIC_RECORD_DRAIN
+            while time.monotonic() < deadline and await asyncio.to_thread(pending):
+                await asyncio.sleep(1)
+    finally:
+        _recorders.pop(recorder.name, None)
+        await asyncio.to_thread(recorder.close)
+        logger.info(f"Recorded {recorder.count} requests of sweep {recorder.sweep} to {recorder.path}")
+
+
+def stop_recording_later(recorder: Recorder, pending=None) -> None:
+    # The drain outlives the sweep; the task is kept so shutdown can end it.
+    task = asyncio.create_task(stop_recording(recorder, pending))
+    _stopping.add(task)
+    task.add_done_callback(_stopping.discard)
+
+
+async def shutdown() -> None:
+    # Cuts draining recordings short and closes them, so every file is a
+    # complete gzip.
+    for task in list(_stopping):
+        task.cancel()
+    await asyncio.gather(*_stopping, return_exceptions=True)
+    for recorder in list(_recorders.values()):
+        _recorders.pop(recorder.name, None)
+        await asyncio.to_thread(recorder.close)
+
+
+def load(path: str) -> dict:
+    recording = {"meta": {}, "state": {}, "http": []}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry["type"] == "meta":
+                recording["meta"] = entry
+            elif entry["type"] == "state":
+                recording["state"][entry["table"]] = entry["rows"]
+            else:
+                recording["http"].append(entry)
+    return recording
+
+
+def restore_state(state: dict) -> None:
+    with local_store.transaction() as conn:
+        for table, rows in state.items():
+            conn.execute(f"DELETE FROM {table}")
+            for row in rows:
+                conn.execute(
+                    f"INSERT INTO {table} ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                    tuple(row.values())
+                )
+
+
+class Replayer:
+    # Answers requests from a recording; nothing reaches the network.
+    # Identical requests get their recorded responses in order, the last one
+    # repeating. Wazzup and NocoDB writes without a recorded answer are
+    # accepted as a dry run; any other unknown request is a miss.
+    DRY_RUN = {"wazzup": (201, '{"messageId": "dry-run"}'), "nocodb": (200, "[]"), "slack": (200, "ok")}
+
+    def __init__(self, entries: list, latency: bool = False):
+        self.latency = latency
+        self.stats = defaultdict(int)
+        self._responses = defaultdict(deque)
+        for entry in entries:
+            self._responses[entry["key"]].append(entry)
+
+    async def respond(self, provider: str, method: str, url: str, kwargs: dict) -> tuple:
+        key = request_key(provider, method, url, kwargs.get("params"), kwargs.get("json"))
+        queue = self._responses.get(key)
+        if not queue:
+            if provider == "slack" or (method == "POST" and provider in self.DRY_RUN):
+                self.stats["dry_run"] += 1
+                status, content = self.DRY_RUN[provider]
+                return status, content.encode(), {}
+            self.stats["missed"] += 1
+            raise ReplayMiss(f"No recorded response for {key}")
+
+        entry = queue.popleft() if len(queue) > 1 else queue[0]
+        self.stats["served"] += 1
+        if self.latency:
+            await asyncio.sleep(entry["elapsed"])
+        if "error" in entry:
+            import aiohttp
+            raise aiohttp.ClientConnectionError(f"Recorded error for {key}: {entry['error']}")
+        return entry["status"], entry["content"].encode(), entry["headers"]
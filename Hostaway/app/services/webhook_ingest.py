@@ -0,0 +1,202 @@
+import asyncio
+import random
+import time
+from collections import OrderedDict
+from typing import Optional
+from pydantic import BaseModel, ConfigDict
+from app.logging_to_file import setup_logger
+from app.db import local_store
+from app.services import delayed_jobs, metrics
+from app.services.pre_check_in_guest_filtering import webhook
+from app.settings import settings
+
+logger = setup_logger(__name__)
+
+WEBHOOK_QUEUE_SIZE = settings.webhook_queue_size
+WEBHOOK_WORKERS = settings.webhook_workers
+WEBHOOK_DEDUPE_SIZE = settings.webhook_dedupe_size
+WEBHOOK_DEDUPE_TTL = settings.webhook_dedupe_ttl
+WEBHOOK_DEFER_DELAY = settings.webhook_defer_delay
+WEBHOOK_DRAIN_TIMEOUT = settings.webhook_drain_timeout
+
+WEB_WORKERS = settings.web_workers
+
+OUTCOMES = ("accepted", "duplicate", "deferred", "dropped", "processed", "failed")
+
+
+class ReservationEvent(BaseModel):
+    # Only what ingestion needs; the rest of the payload is passed through
+    # untouched to the processing stage.
+    model_config = ConfigDict(extra='allow')
+
+    id: int
+    event: Optional[str] = None
+    updatedOn: Optional[str] = None
+    arrivalDate: Optional[str] = None
+
+
+class RecentKeys:
+    # Bounded LRU of recently seen keys, each remembered for `ttl` seconds.
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self._seen = OrderedDict()
+
+    def seen(self, key) -> bool:
+        # Records the key and tells whether it was already there.
+        now = time.monotonic()
+        expires = self._seen.get(key)
+        if expires is not None and expires > now:
+            self._seen.move_to_end(key)
+            return True
+
+        self._seen[key] = now + self.ttl
+        self._seen.move_to_end(key)
+        while len(self._seen) > self.size:
+            self._seen.popitem(last=False)
+        return False
+
+    def forget(self, key) -> None:
+        self._seen.pop(key, None)
+
+    def __len__(self):
+        return len(self._seen)
+
+
+local_store.register_schema("""
+CREATE TABLE IF NOT EXISTS webhook_seen (
+    key TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL
+);
+""")
+
+
+def seen_shared(key: str, ttl: float) -> bool:
+    # Cross-process counterpart of RecentKeys: the insert only goes through
+    # for a key no worker has seen within the TTL.
+    now = time.time()
+    with local_store.transaction() as conn:
+        cursor = conn.execute(
+            "INSERT INTO webhook_seen (key, expires_at) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at WHERE webhook_seen.expires_at < ?",
+            (key, now + ttl, now)
+        )
+        if random.random() < 0.01:
+            conn.execute("DELETE FROM webhook_seen WHERE expires_at < ?", (now,))
+    return cursor.rowcount == 0
+
+
+def forget_shared(key: str) -> None:
+    with local_store.transaction() as conn:
+        conn.execute("DELETE FROM webhook_seen WHERE key = ?", (key,))
+
+
+@delayed_jobs.job("webhook_event")
+async def process_deferred(data: dict):
+    await webhook(data)
+
+
+class WebhookIngest:
+    # Accepts webhook events without waiting for them to be processed.
+    # Duplicates are dropped up front, the rest go through a bounded queue;
+    # when it is full, events are deferred to the durable job table, and only
+    # if that fails too are they shed.
+    def __init__(self, queue_size: int = WEBHOOK_QUEUE_SIZE, workers: int = WEBHOOK_WORKERS,
+                 shared: bool = WEB_WORKERS > 1):
+        self.queue_size = queue_size
+        self.workers = workers
+        # A retry may land on another web worker, so with more than one the
+        # in-memory set is only a first-level filter in front of SQLite.
+        self.shared = shared
+        self.recent = RecentKeys(WEBHOOK_DEDUPE_SIZE, WEBHOOK_DEDUPE_TTL)
+        self._queue = None
+        self._tasks = []
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+        logger.info(f"Started {self.workers} webhook workers")
+
+    async def stop(self):
+        if self._queue is not None and self._tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), WEBHOOK_DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(f"Webhook queue not drained in {WEBHOOK_DRAIN_TIMEOUT}s")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        # Whatever is still queued survives the restart as deferred jobs.
+        while self._queue is not None and not self._queue.empty():
+            await self._defer(self._queue.get_nowait())
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> dict:
+        return {
+            **{outcome: metrics.WEBHOOK_EVENTS.value(outcome=outcome) for outcome in OUTCOMES},
+            "queue_depth": self.depth(),
+            "queue_size": self.queue_size,
+            "dedupe_keys": len(self.recent),
+        }
+
+    async def submit(self, event: ReservationEvent) -> str:
+        key = (event.id, event.event, event.updatedOn)
+        if self.recent.seen(key) or (
+            self.shared and await asyncio.to_thread(seen_shared, repr(key), self.recent.ttl)
+        ):
+            metrics.WEBHOOK_EVENTS.inc(outcome="duplicate")
+            return "duplicate"
+
+        data = event.model_dump(exclude_none=True)
+        try:
+            self._queue.put_nowait(data)
+            metrics.WEBHOOK_EVENTS.inc(outcome="accepted")
+            return "accepted"
+        except asyncio.QueueFull:
+            pass
+
+        if await self._defer(data):
+            return "deferred"
+
+        # Not taken at all, so a retry from Hostaway must not count as a duplicate.
+        self.recent.forget(key)
+        if self.shared:
+            await asyncio.to_thread(forget_shared, repr(key))
+        return "dropped"
+
+    async def _defer(self, data: dict) -> bool:
+        try:
+            await asyncio.to_thread(delayed_jobs.enqueue, "webhook_event", {"data": data}, WEBHOOK_DEFER_DELAY)
+            metrics.WEBHOOK_EVENTS.inc(outcome="deferred")
+            return True
+        except Exception as e:
+            metrics.WEBHOOK_EVENTS.inc(outcome="dropped")
+            logger.error(f"Webhook for {data.get('id')} dropped: {e}", extra={"reservation_id": data.get("id")})
+            return False
+
+    async def _run(self):
+        while True:
+            data = await self._queue.get()
+            try:
+                with metrics.WEBHOOK_SECONDS.time(stage="process"):
+                    await webhook(data)
+                metrics.WEBHOOK_EVENTS.inc(outcome="processed")
+            except Exception as e:
+                metrics.WEBHOOK_EVENTS.inc(outcome="failed")
+                logger.error(f"Webhook processing for {data.get('id')} failed: {e}", exc_info=True,
+                             extra={"reservation_id": data.get("id")})
+                # Hostaway already got its 202, so the retry is ours to make.
+                await self._defer(data)
+            finally:
+                self._queue.task_done()
+
+
+ingest = WebhookIngest()
+
+metrics.Gauge("webhook_queue_depth", "Webhook events waiting in the ingest queue.", collect=ingest.depth)
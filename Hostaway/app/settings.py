@@ -0,0 +1,121 @@
+import os
+from dataclasses import dataclass
+from dotenv import load_dotenv
+
+# All configuration, read once from the environment (and .env) on first
+# import. Modules keep their own constant names as aliases of these fields.
+load_dotenv()
+
+APP_DIR = os.path.dirname(__file__)
+
+
+def _env(cast, name: str, default=None):
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return cast(value)
+
+
+def _flag(name: str, default: bool) -> bool:
+    return _env(str, name, "1" if default else "0") == "1"
+
+
+@dataclass(frozen=True)
+class Settings:
+    # Process
+    web_workers: int = _env(int, 'WEB_WORKERS', 1)
+    local_db_path: str = _env(str, 'LOCAL_DB_PATH', os.path.join(APP_DIR, 'data', 'state.db'))
+
+    # Logging
+    log_level: str = _env(str, 'LOG_LEVEL', 'INFO').upper()
+    log_format: str = _env(str, 'LOG_FORMAT', 'json')
+    log_dir: str = _env(str, 'LOG_DIR', os.path.join(APP_DIR, 'logs'))
+    log_max_bytes: int = _env(int, 'LOG_MAX_BYTES', 10 * 1024 * 1024)
+    log_backup_count: int = _env(int, 'LOG_BACKUP_COUNT', 14)
+    log_rotate_when: str = _env(str, 'LOG_ROTATE_WHEN', 'midnight')
+    log_queue_size: int = _env(int, 'LOG_QUEUE_SIZE', 10000)
+    log_debug_sample_rate: float = _env(float, 'LOG_DEBUG_SAMPLE_RATE', 0.1)
+
+    # Hostaway
+    hostaway_api_url: str = _env(str, 'HOSTAWAY_API_URL', 'https://api.hostaway.com/v1')
+    hostaway_api_key: str = _env(str, 'HOSTAWAY_API_KEY')
+    hostaway_page_limit: int = _env(int, 'HOSTAWAY_PAGE_LIMIT', 100)
+    hostaway_max_concurrent_pages: int = _env(int, 'HOSTAWAY_MAX_CONCURRENT_PAGES', 4)
+    hostaway_max_connections: int = _env(int, 'HOSTAWAY_MAX_CONNECTIONS', 8)
+    hostaway_read_timeout: float = _env(float, 'HOSTAWAY_READ_TIMEOUT', 30)
+    hostaway_rate_per_second: float = _env(float, 'HOSTAWAY_RATE_PER_SECOND')
+    hostaway_burst: int = _env(int, 'HOSTAWAY_BURST', 8)
+    reservation_cache_ttl: int = _env(int, 'RESERVATION_CACHE_TTL', 10 * 60)
+    reservation_full_sync_interval: int = _env(int, 'RESERVATION_FULL_SYNC_INTERVAL', 6 * 60 * 60)
+    listing_page_limit: int = _env(int, 'LISTING_PAGE_LIMIT', 100)
+    listing_cache_ttl: int = _env(int, 'LISTING_CACHE_TTL', 6 * 60 * 60)
+    listing_language_field: str = _env(str, 'LISTING_LANGUAGE_FIELD', 'Message Language')
+
+    # NocoDB
+    api_answers_url: str = _env(str, 'API_ANSWERS_URL')
+    api_reminders_url: str = _env(str, 'API_REMINDERS_URL')
+    db_api_key: str = _env(str, 'DB_API_KEY')
+    nocodb_max_connections: int = _env(int, 'NOCODB_MAX_CONNECTIONS', 8)
+    nocodb_read_timeout: float = _env(float, 'NOCODB_READ_TIMEOUT', 15)
+    nocodb_rate_per_second: float = _env(float, 'NOCODB_RATE_PER_SECOND')
+    nocodb_burst: int = _env(int, 'NOCODB_BURST', 8)
+    reminder_replication_interval: float = _env(float, 'REMINDER_REPLICATION_INTERVAL', 10)
+
+    # Wazzup
+    wazzup_api_url: str = _env(str, 'WAZZUP_API_URL', 'https://api.wazzup24.com/v3')
+    access_token: str = _env(str, 'ACCESS_TOKEN')
+    whatsup_phone_id: str = _env(str, 'WHATSUP_PHONE_ID')
+    wazzup_max_connections: int = _env(int, 'WAZZUP_MAX_CONNECTIONS', 8)
+    wazzup_read_timeout: float = _env(float, 'WAZZUP_READ_TIMEOUT', 15)
+    wazzup_rate_per_second: float = _env(float, 'WAZZUP_RATE_PER_SECOND', 5)
+    wazzup_burst: int = _env(int, 'WAZZUP_BURST', 5)
+    templates_path: str = _env(str, 'TEMPLATES_PATH', os.path.join(APP_DIR, 'config', 'templates.yaml'))
+    templates_reload_interval: float = _env(float, 'TEMPLATES_RELOAD_INTERVAL', 5)
+
+    # Slack
+    slack_api: str = _env(str, 'SLACK_API')
+    slack_batch_lines: int = _env(int, 'SLACK_BATCH_LINES', 20)
+    slack_batch_interval_ms: int = _env(int, 'SLACK_BATCH_INTERVAL_MS', 2000)
+    slack_queue_size: int = _env(int, 'SLACK_QUEUE_SIZE', 1000)
+
+    # Sweeps and scheduler
+    scheduler_enabled: bool = _flag('SCHEDULER_ENABLED', True)
+    scheduler_hours: str = _env(str, 'SCHEDULER_HOURS', '10,13,18')
+    arrivals_plan_hours: str = _env(str, 'ARRIVALS_PLAN_HOURS', '0,10')
+    scheduler_jitter: int = _env(int, 'SCHEDULER_JITTER', 30)
+    scheduler_misfire_grace: int = _env(int, 'SCHEDULER_MISFIRE_GRACE', 15 * 60)
+    scheduler_leader_ttl: int = _env(int, 'SCHEDULER_LEADER_TTL', 60)
+    sweep_lock_ttl: int = _env(int, 'SWEEP_LOCK_TTL', 30 * 60)
+    sweep_batch_size: int = _env(int, 'SWEEP_BATCH_SIZE', 100)
+    reminder_interval: int = _env(int, 'REMINDER_INTERVAL', 2 * 60 * 60)
+
+    # Delayed jobs
+    job_workers: int = _env(int, 'JOB_WORKERS', 4)
+    job_poll_interval: float = _env(float, 'JOB_POLL_INTERVAL', 5)
+    job_lease_seconds: int = _env(int, 'JOB_LEASE_SECONDS', 300)
+    job_max_attempts: int = _env(int, 'JOB_MAX_ATTEMPTS', 3)
+
+    # Outbox
+    outbox_batch: int = _env(int, 'OUTBOX_BATCH', 50)
+    outbox_concurrency: int = _env(int, 'OUTBOX_CONCURRENCY', 10)
+    outbox_poll_interval: float = _env(float, 'OUTBOX_POLL_INTERVAL', 5)
+    outbox_lease_seconds: int = _env(int, 'OUTBOX_LEASE_SECONDS', 120)
+    outbox_max_attempts: int = _env(int, 'OUTBOX_MAX_ATTEMPTS', 5)
+    outbox_retry_base: float = _env(float, 'OUTBOX_RETRY_BASE', 30)
+    # Sent and failed outbox entries (and failed delayed jobs) are kept this long.
+    outbox_retention_days: int = _env(int, 'OUTBOX_RETENTION_DAYS', 30)
+
+    # Webhook ingestion
+    webhook_queue_size: int = _env(int, 'WEBHOOK_QUEUE_SIZE', 1000)
+    webhook_workers: int = _env(int, 'WEBHOOK_WORKERS', 4)
+    webhook_dedupe_size: int = _env(int, 'WEBHOOK_DEDUPE_SIZE', 10000)
+    webhook_dedupe_ttl: int = _env(int, 'WEBHOOK_DEDUPE_TTL', 15 * 60)
+    webhook_defer_delay: int = _env(int, 'WEBHOOK_DEFER_DELAY', 30)
+    webhook_drain_timeout: float = _env(float, 'WEBHOOK_DRAIN_TIMEOUT', 10)
+
+    # Traffic recording
+    traffic_record_dir: str = _env(str, 'TRAFFIC_RECORD_DIR')
+    traffic_record_drain: float = _env(float, 'TRAFFIC_RECORD_DRAIN', 120)
+
+
+settings = Settings()
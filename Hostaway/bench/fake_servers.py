@@ -0,0 +1,175 @@
+import asyncio
+import hashlib
+import json
+import random
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from aiohttp import web
+
+# Local stand-ins for Hostaway, NocoDB, Wazzup and Slack. All four are
+# served by one aiohttp app on its own thread and event loop, so their
+# latency never blocks the service under test.
+
+
+@dataclass
+class FakeConfig:
+    latency_ms: dict = field(default_factory=lambda: {"hostaway": 80, "nocodb": 30, "wazzup": 120, "slack": 20})
+    error_rate: float = 0.0
+    page_limit: int = 100  # Hostaway caps `limit` at this
+    seed: int = 0
+
+
+class FakeServers:
+    def __init__(self, reservations: list = (), config: FakeConfig = None):
+        self.config = config or FakeConfig()
+        self.load(reservations)
+        self.listings = []
+        self.reminders = {}
+        self.calls = Counter()
+        self.port = None
+        self._rng = random.Random(self.config.seed)
+        self._loop = None
+        self._thread = None
+        self._runner = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def env(self) -> dict:
+        # Settings that point the service at these servers.
+        return {
+            "HOSTAWAY_API_URL": f"{self.base_url}/hostaway/v1",
+            "API_REMINDERS_URL": f"{self.base_url}/nocodb/reminders",
+            "WAZZUP_API_URL": f"{self.base_url}/wazzup/v3",
+            "SLACK_API": f"{self.base_url}/slack/post",
+        }
+
+    async def _delay(self, service: str) -> bool:
+        # Sleeps for the service latency and tells whether to fail this call.
+        self.calls[service] += 1
+        latency = self.config.latency_ms.get(service, 0) / 1000
+        if latency:
+            await asyncio.sleep(latency * self._rng.uniform(0.5, 1.5))
+        return self._rng.random() < self.config.error_rate
+
+    async def list_reservations(self, request: web.Request) -> web.Response:
+        if await self._delay("hostaway"):
+            return web.json_response({"status": "fail"}, status=503)
+        query = request.query
+        limit = min(int(query.get("limit", self.config.page_limit)), self.config.page_limit)
+        offset = int(query.get("offset", 0))
+        start = query.get("arrivalStartDate", "")
+        end = query.get("arrivalEndDate", "9999-12-31")
+        matching = [r for r in self.sorted if start <= r["arrivalDate"] <= end]
+        return web.json_response({
+            "status": "success",
+            "result": matching[offset:offset + limit],
+            "count": len(matching),
+            "limit": limit,
+            "offset": offset,
+        })
+
+    async def get_reservation(self, request: web.Request) -> web.Response:
+        if await self._delay("hostaway"):
+            return web.json_response({"status": "fail"}, status=503)
+        data = self.reservations.get(int(request.match_info["id"]))
+        if data is None:
+            return web.json_response({"status": "fail", "result": "Not found"}, status=404)
+        return web.json_response({"status": "success", "result": data})
+
+    async def list_listings(self, request: web.Request) -> web.Response:
+        # Pages carry an ETag and honour If-None-Match like the real API.
+        if await self._delay("hostaway"):
+            return web.json_response({"status": "fail"}, status=503)
+        limit = min(int(request.query.get("limit", self.config.page_limit)), self.config.page_limit)
+        offset = int(request.query.get("offset", 0))
+        body = json.dumps({
+            "status": "success",
+            "result": self.listings[offset:offset + limit],
+            "count": len(self.listings),
+            "limit": limit,
+            "offset": offset,
+        })
+        etag = '"%s"' % hashlib.sha1(body.encode()).hexdigest()
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(text=body, content_type="application/json", headers={"ETag": etag})
+
+    async def list_reminders(self, request: web.Request) -> web.Response:
+        if await self._delay("nocodb"):
+            return web.json_response({"msg": "error"}, status=500)
+        rows = self.reminders.get(request.match_info["table"], [])
+        ids = {int(part.split(",")[2].rstrip(")")) for part in request.query.get("where", "").split("~or") if part}
+        matching = [row for row in rows if row["reservation_id"] in ids]
+        limit = int(request.query.get("limit", 25))
+        offset = int(request.query.get("offset", 0))
+        page = matching[offset:offset + limit]
+        return web.json_response({
+            "list": page,
+            "pageInfo": {"totalRows": len(matching), "isLastPage": offset + len(page) >= len(matching)},
+        })
+
+    async def insert_reminders(self, request: web.Request) -> web.Response:
+        if await self._delay("nocodb"):
+            return web.json_response({"msg": "error"}, status=500)
+        rows = await request.json()
+        self.reminders.setdefault(request.match_info["table"], []).extend(rows)
+        return web.json_response([{"Id": n} for n in range(len(rows))])
+
+    async def send_message(self, request: web.Request) -> web.Response:
+        if await self._delay("wazzup"):
+            return web.json_response({"error": "internal"}, status=500)
+        await request.json()
+        return web.json_response({"messageId": "fake", "chatId": "fake"}, status=201)
+
+    async def post_slack(self, request: web.Request) -> web.Response:
+        if await self._delay("slack"):
+            return web.Response(text="error", status=500)
+        await request.read()
+        return web.Response(text="ok")
+
+    def _app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/hostaway/v1/reservations", self.list_reservations)
+        app.router.add_get("/hostaway/v1/reservations/{id}", self.get_reservation)
+        app.router.add_get("/hostaway/v1/listings", self.list_listings)
+        app.router.add_get("/nocodb/reminders/{table}", self.list_reminders)
+        app.router.add_post("/nocodb/reminders/{table}", self.insert_reminders)
+        app.router.add_post("/wazzup/v3/message", self.send_message)
+        app.router.add_post("/slack/post", self.post_slack)
+        return app
+
+    async def _start(self):
+        self._runner = web.AppRunner(self._app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def start(self) -> "FakeServers":
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="fake-servers", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self
+
+    def load(self, reservations: list, listings: list = None):
+        if listings is not None:
+            self.listings = listings
+        self.reservations = {r["id"]: r for r in reservations}
+        self.sorted = sorted(reservations, key=lambda r: r["arrivalDate"])
+
+    def reset(self):
+        self.reminders.clear()
+        self.calls.clear()
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        self._loop.close()
+        self._loop = None
@@ -0,0 +1,280 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from bench import synthetic
+from bench.fake_servers import FakeConfig, FakeServers
+
+# Offline benchmark for the sweeps and the webhook path.
+#
+#   python -m bench.run --sizes 10,100,1000 --output bench-results.json
+#   python -m bench.run --compare old.json new.json
+#
+# The service is imported only after its settings point at the fake
+# servers and a throwaway local database.
+
+BENCHMARKS = ("check_verifications", "check_verifications_rerun", "arrivals", "webhook")
+# Share of reservations a webhook touches between the two rerun sweeps.
+RERUN_CHANGE_RATE = 0.05
+
+
+def percentile(samples: list, q: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def stats(samples: list) -> dict:
+    return {
+        "runs": len(samples),
+        "p50_s": round(percentile(samples, 50), 6),
+        "p99_s": round(percentile(samples, 99), 6),
+        "mean_s": round(sum(samples) / len(samples), 6) if samples else 0.0,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def configure_env(servers: FakeServers, args, workdir: str) -> None:
+    os.environ.update(servers.env())
+    os.environ.update({
+        "LOCAL_DB_PATH": os.path.join(workdir, "state.db"),
+        "LOG_DIR": os.path.join(workdir, "logs"),
+        "LOG_LEVEL": "ERROR",
+        "SCHEDULER_ENABLED": "0",
+        "HOSTAWAY_PAGE_LIMIT": str(args.page_limit),
+        "WAZZUP_RATE_PER_SECOND": str(args.wazzup_rate),
+        "WAZZUP_BURST": str(max(1, int(args.wazzup_rate))),
+    })
+
+
+def reset_state(servers: FakeServers) -> None:
+    # Every run starts cold: empty reservation cache, ledger and job table.
+    from app.db import local_store
+
+    with local_store.transaction() as conn:
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        )]
+        for table in tables:
+            conn.execute(f"DELETE FROM {table}")
+    servers.reset()
+
+
+async def wait_for_outbox(poll: float = 0.05) -> None:
+    from app.services import outbox
+
+    while await asyncio.to_thread(outbox.pending_count):
+        await asyncio.sleep(poll)
+
+
+async def bench_sweep(name: str, size: int, servers: FakeServers, repeats: int) -> dict:
+    from app.services.scheduler import run_sweep
+
+    # A sweep only queues messages; delivery by the outbox sender is timed
+    # separately, from the start of the sweep until the outbox is empty.
+    samples, deliveries, result = [], [], {}
+    for _ in range(repeats):
+        await asyncio.to_thread(reset_state, servers)
+        started = time.perf_counter()
+        result = await run_sweep(name)
+        samples.append(time.perf_counter() - started)
+        await wait_for_outbox()
+        deliveries.append(time.perf_counter() - started)
+
+    summary = result.get("summary", {})
+    processed = summary.get("total", 0)
+    return {
+        "benchmark": name,
+        "size": size,
+        **stats(samples),
+        "throughput_per_s": round(processed / stats(samples)["p50_s"], 2) if samples and processed else 0.0,
+        "delivered_p50_s": round(percentile(deliveries, 50), 6),
+        "status_code": result.get("status_code"),
+        "outcomes": summary.get("counts", {}),
+        "calls": dict(servers.calls),
+    }
+
+
+async def bench_rerun(size: int, reservations: list, servers: FakeServers, repeats: int) -> dict:
+    from app.db import reservation_state
+    from app.services.scheduler import run_sweep
+
+    # A second verification sweep over a warm window in which only a few
+    # reservations changed: its cost should follow the change, not the size.
+    changed = [data["id"] for data in reservations[::max(1, int(1 / RERUN_CHANGE_RATE))]]
+    samples, result = [], {}
+    for _ in range(repeats):
+        await asyncio.to_thread(reset_state, servers)
+        await run_sweep("check_verifications")
+        await wait_for_outbox()
+        await asyncio.to_thread(reservation_state.invalidate, changed)
+        servers.calls.clear()
+
+        started = time.perf_counter()
+        result = await run_sweep("check_verifications")
+        samples.append(time.perf_counter() - started)
+        await wait_for_outbox()
+
+    summary = result.get("summary", {})
+    return {
+        "benchmark": "check_verifications_rerun",
+        "size": size,
+        **stats(samples),
+        "throughput_per_s": round(summary.get("total", 0) / stats(samples)["p50_s"], 2) if samples else 0.0,
+        "status_code": result.get("status_code"),
+        "outcomes": summary.get("counts", {}),
+        "calls": dict(servers.calls),
+    }
+
+
+async def bench_webhook(size: int, reservations: list, servers: FakeServers, repeats: int) -> dict:
+    import httpx
+    from app.main import app
+    from app.services.webhook_ingest import RecentKeys, ingest
+
+    latencies, totals = [], []
+    transport = httpx.ASGITransport(app=app)
+    for _ in range(repeats):
+        await asyncio.to_thread(reset_state, servers)
+        ingest.recent = RecentKeys(ingest.recent.size, ingest.recent.ttl)
+        ingest.start()
+        started = time.perf_counter()
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for data in reservations:
+                sent = time.perf_counter()
+                response = await client.post("/webhook/reservation", json=data)
+                latencies.append(time.perf_counter() - sent)
+                response.raise_for_status()
+        await ingest.stop()
+        totals.append(time.perf_counter() - started)
+
+    return {
+        "benchmark": "webhook",
+        "size": size,
+        **stats(latencies),
+        "throughput_per_s": round(size / percentile(totals, 50), 2) if totals else 0.0,
+        "drain_p50_s": round(percentile(totals, 50), 6),
+        "calls": dict(servers.calls),
+    }
+
+
+async def run_all(args, servers: FakeServers) -> list:
+    from app.services.http_client import client as http_client
+    from app.services.outbox import sender as outbox_sender
+    from app.services.slack_error_handler import notifier
+
+    results = []
+    outbox_sender.start()
+    try:
+        for size in args.sizes:
+            reservations = synthetic.reservations(size, args.seed)
+            servers.load(reservations, synthetic.listings(args.seed))
+            for name in args.benchmarks:
+                if name == "webhook":
+                    result = await bench_webhook(size, reservations, servers, args.repeats)
+                elif name == "check_verifications_rerun":
+                    result = await bench_rerun(size, reservations, servers, args.repeats)
+                else:
+                    result = await bench_sweep(name, size, servers, args.repeats)
+                results.append(result)
+                print(f"{name:>20} size={size:<6} p50={result['p50_s']:.4f}s p99={result['p99_s']:.4f}s "
+                      f"throughput={result['throughput_per_s']}/s", file=sys.stderr)
+    finally:
+        await outbox_sender.stop()
+        await asyncio.to_thread(notifier.shutdown)
+        await asyncio.to_thread(http_client.close)
+    return results
+
+
+def compare(old_path: str, new_path: str) -> None:
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    before = {(r["benchmark"], r["size"]): r for r in old["results"]}
+    print(f"{'benchmark':>20} {'size':>6} {'p50 ' + old['commit']:>14} {'p50 ' + new['commit']:>14} {'change':>8}")
+    for r in new["results"]:
+        o = before.get((r["benchmark"], r["size"]))
+        if o is None:
+            continue
+        change = (r["p50_s"] - o["p50_s"]) / o["p50_s"] * 100 if o["p50_s"] else 0.0
+        print(f"{r['benchmark']:>20} {r['size']:>6} {o['p50_s']:>14.4f} {r['p50_s']:>14.4f} {change:>+7.1f}%")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark against local fake APIs")
+    parser.add_argument("--sizes", default="10,100,1000,10000",
+                        type=lambda s: [int(n) for n in s.split(",")])
+    parser.add_argument("--benchmarks", default=",".join(BENCHMARKS), type=lambda s: s.split(","))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", default="hostaway=80,nocodb=30,wazzup=120,slack=20",
+                        help="per-service latency, e.g. hostaway=80,wazzup=120")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--page-limit", type=int, default=100)
+    parser.add_argument("--wazzup-rate", type=float, default=200,
+                        help="Wazzup sends per second; production default is 5")
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        sys.exit(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    latency = {k: float(v) for k, v in (item.split("=") for item in args.latency_ms.split(",") if item)}
+    config = FakeConfig(latency_ms=latency, error_rate=args.error_rate, page_limit=args.page_limit, seed=args.seed)
+
+    servers = FakeServers(config=config).start()
+    with tempfile.TemporaryDirectory(prefix="hostaway-bench-") as workdir:
+        configure_env(servers, args, workdir)
+        try:
+            results = asyncio.run(run_all(args, servers))
+        finally:
+            servers.stop()
+
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {
+            "latency_ms": latency,
+            "error_rate": args.error_rate,
+            "page_limit": args.page_limit,
+            "wazzup_rate": args.wazzup_rate,
+            "repeats": args.repeats,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
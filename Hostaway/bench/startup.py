@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timezone
+from bench.run import git_commit, stats
+
+# Cold-start benchmark: how long a fresh process takes to import the
+# service, and how long uvicorn takes from spawn to answering requests and
+# from SIGTERM to exit.
+#
+#   python -m bench.startup --repeats 10 --output startup-results.json
+
+IMPORT_TARGETS = ("app.main", "app.script.script")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_import(module: str, env: dict) -> float:
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def time_web(env: dict, timeout: float = 30) -> tuple:
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            if time.perf_counter() - started > timeout:
+                raise TimeoutError("service did not come up")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/webhook/stats", timeout=1) as response:
+                    if response.status == 200:
+                        break
+            except OSError:
+                time.sleep(0.01)
+        ready = time.perf_counter() - started
+
+        stopping = time.perf_counter()
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout)
+        return ready, time.perf_counter() - stopping
+    finally:
+        if process.poll() is None:
+            process.kill()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold-start benchmark of the web service")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", default="startup-results.json")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="hostaway-startup-") as workdir:
+        env = dict(os.environ)
+        env.update({
+            "LOCAL_DB_PATH": os.path.join(workdir, "state.db"),
+            "LOG_DIR": os.path.join(workdir, "logs"),
+            "LOG_LEVEL": "WARNING",
+            "SLACK_API": "",
+        })
+
+        for module in IMPORT_TARGETS:
+            samples = [time_import(module, env) for _ in range(args.repeats)]
+            results.append({"benchmark": f"import {module}", **stats(samples)})
+
+        ready, stopped = zip(*(time_web(env) for _ in range(args.repeats)))
+        results.append({"benchmark": "web ready", **stats(list(ready))})
+        results.append({"benchmark": "web shutdown", **stats(list(stopped))})
+
+    for result in results:
+        print(f"{result['benchmark']:>26} p50={result['p50_s']:.3f}s p99={result['p99_s']:.3f}s", file=sys.stderr)
+
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import random
+from datetime import date, datetime, timedelta
+
+VERIFICATION_FIELD = 'Identity Verification Status'
+REGISTRATION_FIELD = 'Check-in Online Status'
+
+COUNTRIES = ["EN", "ES", "DE", "FR", "IT", "NL", "UA", "RU", "PT", "PL", "US"]
+CHANNELS = ["airbnbOfficial", "bookingcom", "direct", "vrbo"]
+STATUSES = ["new"] * 8 + ["modified"] * 3 + ["cancelled", "inquiry"]
+LISTING_IDS = range(100_000, 100_201)
+
+# Custom fields a real listing carries besides the two the service reads.
+OTHER_FIELDS = [
+    (61001, "Door Code"),
+    (61002, "Parking Spot"),
+    (61003, "Late Check-in Fee Paid"),
+    (61004, "Guest Notes"),
+    (61005, "Cleaning Team"),
+]
+
+
+def custom_field(rng: random.Random, field_id: int, name: str, value: str) -> dict:
+    return {
+        "id": rng.randint(10_000_000, 99_999_999),
+        "customFieldId": field_id,
+        "customField": {"id": field_id, "name": name, "type": "text", "isPublic": 0},
+        "value": value,
+    }
+
+
+def reservation(id: int, arrival: date, rng: random.Random) -> dict:
+    nights = rng.randint(1, 7)
+    verification = rng.choices(["VERIFIED", "PENDING", ""], weights=[5, 3, 2])[0]
+    registration = rng.choices(["COMPLETED", "PENDING", ""], weights=[5, 3, 2])[0]
+
+    fields = [
+        custom_field(rng, 60001, VERIFICATION_FIELD, verification),
+        custom_field(rng, 60002, REGISTRATION_FIELD, registration),
+    ]
+    fields += [custom_field(rng, field_id, name, str(rng.randint(1000, 9999)))
+               for field_id, name in rng.sample(OTHER_FIELDS, rng.randint(1, len(OTHER_FIELDS)))]
+
+    updated = datetime.now() - timedelta(minutes=rng.randint(0, 60 * 24 * 30))
+    return {
+        "id": id,
+        "listingMapId": rng.choice(LISTING_IDS),
+        "channelName": rng.choice(CHANNELS),
+        "status": rng.choice(STATUSES),
+        "guestName": f"Guest {id}",
+        "guestEmail": f"guest{id}@example.com",
+        "guestCountry": rng.choice(COUNTRIES),
+        "phone": f"+34 6{rng.randint(10_000_000, 99_999_999)}",
+        "numberOfGuests": rng.randint(1, 6),
+        "arrivalDate": arrival.isoformat(),
+        "departureDate": (arrival + timedelta(days=nights)).isoformat(),
+        "nights": nights,
+        "checkInTime": rng.choice([None, 14, 15, 15, 16, 16, 17, 18, 20]),
+        "checkOutTime": 11,
+        "totalPrice": round(rng.uniform(80, 1500), 2),
+        "currency": "EUR",
+        "insertedOn": (updated - timedelta(days=rng.randint(1, 90))).strftime("%Y-%m-%d %H:%M:%S"),
+        "updatedOn": updated.strftime("%Y-%m-%d %H:%M:%S"),
+        "latestActivityOn": updated.strftime("%Y-%m-%d %H:%M:%S"),
+        "customFieldValues": fields,
+    }
+
+
+def reservations(count: int, seed: int = 0) -> list:
+    # Arrivals spread over today and tomorrow, the window both sweeps read.
+    rng = random.Random(seed)
+    today = date.today()
+    return [reservation(1_000_000 + n, today + timedelta(days=rng.randint(0, 1)), rng) for n in range(count)]
+
+
+def listing(id: int, rng: random.Random) -> dict:
+    return {
+        "id": id,
+        "name": f"Apartment {id}",
+        "city": "Barcelona",
+        "countryCode": "ES",
+        "timeZoneName": "Europe/Madrid",
+        "checkInTimeStart": rng.choice([14, 15, 16]),
+        "checkInTimeEnd": 23,
+        "checkOutTime": 11,
+        "customFieldValues": [custom_field(rng, 62001, "Message Language", rng.choice(["ES", "EN"]))],
+    }
+
+
+def listings(seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [listing(id, rng) for id in LISTING_IDS]
@@ -0,0 +1,14 @@
+import os
+import tempfile
+
+# Settings are read once on import, so the throwaway database has to be in
+# place before any test imports the service.
+_workdir = tempfile.mkdtemp(prefix="hostaway-tests-")
+os.environ.update({
+    "LOCAL_DB_PATH": os.path.join(_workdir, "state.db"),
+    "LOG_DIR": os.path.join(_workdir, "logs"),
+    "LOG_LEVEL": "WARNING",
+    "SCHEDULER_ENABLED": "0",
+    "SLACK_API": "",
+    "TRAFFIC_RECORD_DIR": "",
+})
@@ -0,0 +1,63 @@
+import asyncio
+import time
+import pytest
+from app.db import local_store
+from app.services import delayed_jobs, outbox
+
+
+@pytest.fixture(autouse=True)
+def empty_outbox():
+    with local_store.transaction() as conn:
+        conn.execute("DELETE FROM outbox")
+        conn.execute("DELETE FROM delayed_jobs")
+
+
+def insert(status: str, at: float, sent_at: float = None) -> int:
+    with local_store.transaction() as conn:
+        cursor = conn.execute(
+            "INSERT INTO outbox (reservation_id, phone, country, action, step, status, next_attempt_at, "
+            "created_at, sent_at) VALUES (1, '+34600000000', 'ES', 'reservation_check', 1, ?, ?, ?, ?)",
+            (status, at, at, sent_at)
+        )
+    return cursor.lastrowid
+
+
+def statuses() -> dict:
+    rows = local_store.connect().execute("SELECT id, status, last_error FROM outbox").fetchall()
+    return {row["id"]: (row["status"], row["last_error"]) for row in rows}
+
+
+def test_prune_drops_only_old_finished_entries():
+    now = time.time()
+    old_sent = insert("sent", now - 100, sent_at=now - 100)
+    old_failed = insert("failed", now - 100)
+    insert("sent", now - 100, sent_at=now)
+    insert("pending", now - 100)
+
+    assert outbox.prune(now - 10) == 2
+    remaining = statuses()
+    assert old_sent not in remaining and old_failed not in remaining
+    assert len(remaining) == 2
+
+
+def test_prune_failed_jobs():
+    job_id = delayed_jobs.enqueue("noop", {}, delay_seconds=-100)
+    pending_id = delayed_jobs.enqueue("noop", {}, delay_seconds=-100)
+    delayed_jobs.fail_job(job_id, delayed_jobs.JOB_MAX_ATTEMPTS, "boom")
+
+    assert delayed_jobs.prune_failed(time.time() - 10) == 1
+    rows = local_store.connect().execute("SELECT id FROM delayed_jobs").fetchall()
+    assert [row["id"] for row in rows] == [pending_id]
+
+
+def test_cancelled_delivery_is_recorded_and_released(monkeypatch):
+    async def cancelled(*args):
+        raise asyncio.CancelledError()
+
+    monkeypatch.setattr(outbox, "send_message_async", cancelled)
+    entry = insert("pending", time.time() - 1)
+
+    assert asyncio.run(outbox.OutboxSender().send_batch()) == 1
+    status, error = statuses()[entry]
+    assert status == "pending"
+    assert error.startswith("CancelledError")
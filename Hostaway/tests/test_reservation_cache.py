@@ -0,0 +1,42 @@
+import time
+import pytest
+from app.db import local_store, reservation_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    with local_store.transaction() as conn:
+        conn.execute("DELETE FROM reservations")
+        conn.execute("DELETE FROM reservation_syncs")
+
+
+def reservation(id: int, arrival_date: str) -> dict:
+    return {"id": id, "arrivalDate": arrival_date, "status": "new"}
+
+
+def test_full_sync_drops_reservations_no_longer_listed():
+    reservation_cache.put([reservation(1, "2026-07-01"), reservation(2, "2026-07-01"), reservation(3, "2026-07-02")])
+    started_at = time.time() + 1
+
+    # Reservation 2 moved to another date without a webhook: the listing of
+    # the window only returns 1 and 3.
+    dropped = reservation_cache.finish_full_sync("2026-07-01", "2026-07-02", {1, 3}, started_at)
+
+    assert dropped == 1
+    assert [r["id"] for r in reservation_cache.window("2026-07-01", "2026-07-02")] == [1, 3]
+    assert reservation_cache.last_sync("2026-07-01", "2026-07-02") == (started_at, started_at)
+
+
+def test_full_sync_keeps_rows_outside_the_window_and_newer_than_the_listing():
+    reservation_cache.put([reservation(1, "2026-06-30")])
+    started_at = time.time()
+    # Written by a webhook while the listing was running.
+    reservation_cache.put([reservation(2, "2026-07-01")])
+
+    assert reservation_cache.finish_full_sync("2026-07-01", "2026-07-01", set(), started_at) == 0
+    assert [r["id"] for r in reservation_cache.window("2026-06-30", "2026-07-01")] == [1, 2]
+
+
+def test_incremental_sync_is_not_a_full_sync():
+    reservation_cache.mark_synced("2026-07-01", "2026-07-01", 1000, False)
+    assert reservation_cache.last_sync("2026-07-01", "2026-07-01") == (1000.0, 0.0)